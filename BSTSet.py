@@ -12,6 +12,7 @@
 
 from __future__ import print_function
 import sys
+from itertools import islice
 from random import randint
 
 ## Compare two objects.
@@ -33,6 +34,13 @@ def cmp(x, y):
  # Binary search tree implementation of the Collections interface.  
  #  - The \_\_contains\_\_() and remove() methods of Collections Abstract Base Classes are overridden 
  #    to search the tree without using the iterator.
+ #  - Like sorted(), the tree may be given a key function, which orders the
+ #    elements by a key computed once, when they are added, and cached in
+ #    their nodes. The methods taking elements (add, remove, \_\_contains\_\_,
+ #    contains_many) apply it, while findEntry, find_many and the ordered
+ #    queries (floor, ceiling, irange, cursor, ...) take key values.
+ #    The set comparisons compare the keys, and the extra slot holding them
+ #    is only added to the nodes of trees given a key function.
  #   
  #   To run:
  #      - python BSTSet.py
@@ -49,6 +57,10 @@ class BSTSet(object):
      # Node type for this implementation.
      #
     class Node(object):
+        ## Fixed attributes, so nodes have no per-instance __dict__.
+         #  Subclasses may add theirs, or omit __slots__ to get a __dict__.
+        __slots__ = ('data', 'parent', 'left', 'right')
+
         ##
          #  Constructor given a data object and the parent of this node.
          #
@@ -74,25 +86,84 @@ class BSTSet(object):
              return "Node: %s, Size: %d" % \
                    ( self.data, sys.getsizeof(self) )
 
-        ## Compares the data of this node to a given key.
+        ## Compares the key of this node to a given key.
         #
-        #  @return 1 if the data of this object is greater than key's, <br>
-        #         -1 if the data of this object is smaller than key's or <br>
+        #  @return 1 if the key of this object is greater than key, <br>
+        #         -1 if the key of this object is smaller than key or <br>
         #          0 if it is equal
         #
         def compareTo(self,key):
-            return cmp(self.data,key)
+            return cmp(self.key,key)
+
+    ## Key the tree is ordered by, which is the data itself, read through
+     #  the same slot. The nodes of a tree with a key function are made by
+     #  keyedNode(), and keep the value of the key function in a slot of their own.
+    Node.key = Node.data
 
     ##
      # Constructs an empty binary search tree.
      #
-    def __init__(self, b=False):
+     # @param key function of one argument giving the key that orders
+     #        the elements, or None to order them by themselves.
+     #
+    def __init__(self, b=False, key=None):
+        ## Key function, or None.
+        self.key = key
+        if key is not None:
+            ## Node type of this tree, with a slot for the cached keys.
+            self.Node = keyedNode(self.Node)
+
         ## Root of this tree.
         self.__root = None
 
         ## Number of elements in this tree.
         self.__size = 0
 
+    ##
+     # Builds a perfectly balanced tree from keys given in ascending order,
+     # in linear time. Repeated keys are stored only once.
+     #
+     # @param iterable keys in ascending order.
+     # @param key function giving the key that orders the elements, or None.
+     # @return a new tree holding the given keys.
+     # @throw ValueError if the keys are not in ascending order.
+     #
+    @classmethod
+    def from_sorted(cls, iterable, key=None):
+        tree = cls(key=key)
+        nodes = []
+        for obj in iterable:
+            node = tree.newNode(obj, None)
+            if nodes:
+                comp = nodes[-1].compareTo(node.key)
+                if comp == 0:
+                    continue
+                if comp > 0:
+                    raise ValueError("keys are not in ascending order")
+            nodes.append(node)
+
+        if nodes:
+            # the midpoint of each range of nodes is the root of its subtree,
+            # and the ranges still to be linked are kept in a stack
+            mid = len(nodes) // 2
+            tree.__root = nodes[mid]
+            stack = [(0, mid - 1, nodes[mid], True), (mid + 1, len(nodes) - 1, nodes[mid], False)]
+            while stack:
+                start, end, parent, isLeft = stack.pop()
+                if start > end:
+                    continue
+                mid = (start + end + 1) // 2
+                node = nodes[mid]
+                node.parent = parent
+                if isLeft:
+                    parent.left = node
+                else:
+                    parent.right = node
+                stack.append((start, mid - 1, node, True))
+                stack.append((mid + 1, end, node, False))
+        tree.__size = len(nodes)
+        return tree
+
     ##
      # Returns a read-only view of the root node of this tree.
      # @return root node of this tree.
@@ -127,21 +198,79 @@ class BSTSet(object):
      # @return True if the object is in the tree, or False otherwise.  
      # 
     def __contains__(self, obj):
-        return self.findEntry(obj) != None
+        return self.findEntry(self.sortKey(obj)) != None
+
+    ##
+     # Returns the key that orders a given element in this tree.
+     #
+     # @param obj given element.
+     # @return obj under the key function, or obj itself if there is none.
+     #
+    def sortKey(self, obj):
+        return obj if self.key is None else self.key(obj)
+
+    ##
+     # Creates a node for a given element, caching its key.
+     #
+     # @param obj given element.
+     # @param parent parent node.
+     # @return the new node, not yet linked to the tree.
+     #
+    def newNode(self, obj, parent):
+        n = self.Node(obj, parent)
+        if self.key is not None:
+            n.key = self.key(obj)
+        return n
+
+    ##
+     # Returns whether the nodes of this tree keep the natural order of
+     # their keys, that is, whether Node.compareTo is not overridden.
+     # The descents then compare keys directly, with a single "<" per level,
+     # and call compareTo otherwise.
+     #
+    def hasNaturalOrder(self):
+        return self.Node.compareTo is BSTSet.Node.compareTo
 
     ##
      # Adds the given object to this tree.
+     # In natural order, the descent only tests key < node key, and keeps
+     # the last node passed to the right, the only one that may hold key.
+     # Its key is not greater than key, so it holds key unless it is
+     # smaller, which needs only "<" of the keys, as compareTo did.
      #
      # @param key given object.
      # @return True if the object was found, and False otherwise.
      # 
     def add(self, key):
         if self.__root is None:
-            self.__root = self.Node(key, None)
+            self.__root = self.newNode(key, None)
             self.__size += 1
             return True
         
+        obj, key = key, self.sortKey(key)
         current = self.__root
+        if self.hasNaturalOrder():
+            parent = candidate = None
+            while current is not None:
+                parent = current
+                if key < current.key:
+                    current = current.left
+                else:
+                    candidate = current
+                    current = current.right
+
+            if candidate is not None and not candidate.key < key:
+                # key is already in the tree
+                return False
+
+            # the last step went right only if parent is the candidate
+            if candidate is parent:
+                parent.right = self.newNode(obj, parent)
+            else:
+                parent.left = self.newNode(obj, parent)
+            self.__size += 1
+            return True
+
         while True:
             comp = current.compareTo(key)
             if (comp == 0):
@@ -151,14 +280,14 @@ class BSTSet(object):
                 if (current.left != None):
                     current = current.left
                 else:
-                    current.left = self.Node(key, current)
+                    current.left = self.newNode(obj, current)
                     self.__size += 1
                     return True
             else:
                 if (current.right != None):
                     current = current.right
                 else:
-                    current.right = self.Node(key, current)
+                    current.right = self.newNode(obj, current)
                     self.__size += 1
                     return True
 
@@ -178,7 +307,7 @@ class BSTSet(object):
      # @return True if the object was found, and False otherwise.
      # 
     def remove(self, obj):
-        n = self.findEntry(obj)
+        n = self.findEntry(self.sortKey(obj))
         if n is None:
             return False
         
@@ -193,6 +322,19 @@ class BSTSet(object):
      #
     def findEntry(self, key):
         current = self.__root
+        if self.hasNaturalOrder():
+            # last node passed to the right, the only one that may hold key
+            candidate = None
+            while current is not None:
+                if key < current.key:
+                    current = current.left
+                else:
+                    candidate = current
+                    current = current.right
+            if candidate is not None and not candidate.key < key:
+                return candidate
+            return None
+
         while (current != None):
             comp = current.compareTo(key)
             if (comp == 0):
@@ -229,6 +371,217 @@ class BSTSet(object):
             # either current is None, or child is left child of current
             return current
 
+    ##
+     # Returns the predecessor of the given node.
+     # @param n
+     # @return the predecessor of the given node in this tree, 
+     #   or None if there is no predecessor.
+     #
+    def predecessor(self, n):
+        if (n == None):
+            return None
+        elif (n.left != None):
+            # rightmost entry in left subtree
+            current = n.left
+            while (current.right != None):
+                current = current.right
+            return current
+        else:
+            # we need to go up the tree to the closest ancestor that is
+            # a right child its parent must be the predecessor
+            current = n.parent
+            child = n
+            while (current != None and current.left == child):
+                child = current
+                current = current.parent
+            # either current is None, or child is right child of current
+            return current
+
+    ##
+     # Returns the node containing the smallest key, or None if the tree is empty.
+     #
+    def firstEntry(self):
+        current = self.root()
+        if (current != None):
+            while (current.left != None):
+                current = current.left
+        return current
+
+    ##
+     # Returns the node containing the largest key, or None if the tree is empty.
+     #
+    def lastEntry(self):
+        current = self.root()
+        if (current != None):
+            while (current.right != None):
+                current = current.right
+        return current
+
+    ##
+     # Returns the node containing the smallest key greater than or equal
+     # to the given key, in a single descent from the root.
+     # @param key
+     # @return the node found, or None if there is no such key.
+     #
+    def ceilingEntry(self, key):
+        best = None
+        current = self.root()
+        while (current != None):
+            comp = current.compareTo(key)
+            if (comp == 0):
+                return current
+            elif (comp > 0):
+                best = current
+                current = current.left
+            else:
+                current = current.right
+        return best
+
+    ##
+     # Returns the node containing the smallest key strictly greater
+     # than the given key, in a single descent from the root.
+     # @param key
+     # @return the node found, or None if there is no such key.
+     #
+    def higherEntry(self, key):
+        best = None
+        current = self.root()
+        while (current != None):
+            if (current.compareTo(key) > 0):
+                best = current
+                current = current.left
+            else:
+                current = current.right
+        return best
+
+    ##
+     # Returns the node containing the largest key less than or equal
+     # to the given key, in a single descent from the root.
+     # @param key
+     # @return the node found, or None if there is no such key.
+     #
+    def floorEntry(self, key):
+        best = None
+        current = self.root()
+        while (current != None):
+            comp = current.compareTo(key)
+            if (comp == 0):
+                return current
+            elif (comp < 0):
+                best = current
+                current = current.right
+            else:
+                current = current.left
+        return best
+
+    ##
+     # Returns the node containing the largest key strictly less
+     # than the given key, in a single descent from the root.
+     # @param key
+     # @return the node found, or None if there is no such key.
+     #
+    def lowerEntry(self, key):
+        best = None
+        current = self.root()
+        while (current != None):
+            if (current.compareTo(key) < 0):
+                best = current
+                current = current.right
+            else:
+                current = current.left
+        return best
+
+    ## Returns the largest key less than or equal to key, or None.
+    def floor(self, key):
+        n = self.floorEntry(key)
+        return None if n is None else n.data
+
+    ## Returns the smallest key greater than or equal to key, or None.
+    def ceiling(self, key):
+        n = self.ceilingEntry(key)
+        return None if n is None else n.data
+
+    ## Returns the largest key strictly less than key, or None.
+    def lower(self, key):
+        n = self.lowerEntry(key)
+        return None if n is None else n.data
+
+    ## Returns the smallest key strictly greater than key, or None.
+    def higher(self, key):
+        n = self.higherEntry(key)
+        return None if n is None else n.data
+
+    ##
+     # Returns the key closest to the given key, which is computed by keeping
+     # track of both the floor and the ceiling in a single descent.
+     # Keys must support subtraction. On a tie, the smaller key is returned.
+     #
+     # @param key given key, not necessarily in the tree.
+     # @return the nearest key, or None if the tree is empty.
+     #
+    def nearest(self, key):
+        lo = hi = None
+        current = self.root()
+        while (current != None):
+            comp = current.compareTo(key)
+            if (comp == 0):
+                return current.data
+            elif (comp > 0):
+                hi = current
+                current = current.left
+            else:
+                lo = current
+                current = current.right
+
+        if lo is None:
+            return None if hi is None else hi.data
+        if hi is None:
+            return lo.data
+        return lo.data if key - lo.key <= hi.key - key else hi.data
+
+    ##
+     # Iterates lazily over the keys between lo and hi.
+     # The first node is found in a single descent, and the following ones
+     # are reached through successor (or predecessor), so the keys outside
+     # the range are never visited.
+     #
+     # @param lo lower bound, or None for no lower bound.
+     # @param hi upper bound, or None for no upper bound.
+     # @param inclusive pair telling whether lo and hi belong to the range.
+     # @param reverse whether the keys are returned in descending order.
+     #
+    def irange(self, lo=None, hi=None, inclusive=(True, True), reverse=False):
+        if reverse:
+            if hi is None:
+                n = self.lastEntry()
+            elif inclusive[1]:
+                n = self.floorEntry(hi)
+            else:
+                n = self.lowerEntry(hi)
+
+            while n is not None:
+                if lo is not None:
+                    comp = n.compareTo(lo)
+                    if comp < 0 or (comp == 0 and not inclusive[0]):
+                        return
+                yield n.data
+                n = self.predecessor(n)
+        else:
+            if lo is None:
+                n = self.firstEntry()
+            elif inclusive[0]:
+                n = self.ceilingEntry(lo)
+            else:
+                n = self.higherEntry(lo)
+
+            while n is not None:
+                if hi is not None:
+                    comp = n.compareTo(hi)
+                    if comp > 0 or (comp == 0 and not inclusive[1]):
+                        return
+                yield n.data
+                n = self.successor(n)
+
     ##
      # Removes the given node, preserving the binary search
      # tree property of the tree.
@@ -243,6 +596,7 @@ class BSTSet(object):
         if (n.left != None and n.right != None):
             s = self.successor(n)
             n.data = s.data
+            n.key = s.key
             n = s # causes s to be deleted in code below
             startNode = s.parent
 
@@ -271,11 +625,193 @@ class BSTSet(object):
     ## Returns an iterator for this tree.
     def iterator(self):
         return self.BSTIterator(self)
+
+    ##
+     # Returns a cursor over this tree.
+     #
+     # @param key if given, the cursor is placed at the smallest key
+     #        greater than or equal to it, otherwise at the smallest key.
+     # @return a new cursor.
+     #
+    def cursor(self, key=None):
+        c = self.Cursor(self)
+        if key is not None:
+            c.seek(key)
+        return c
     
+    ##
+     # Returns whether each of a batch of elements is in this tree.
+     #
+     # @param keys iterable of elements, in any order.
+     # @return list of booleans, in the order of the elements.
+     # @see find_many
+     #
+    def contains_many(self, keys):
+        return [n is not None for n in self.find_many(map(self.sortKey, keys))]
+
+    ##
+     # Returns the node holding each of a batch of keys.
+     # A batch that is small for the size of the tree is answered by one
+     # findEntry() per key, which is cheaper than any shared traversal.
+     # A batch of m keys with m log n above a few times n is sorted once
+     # and merged with a single in-order walk of the tree, in O(n + m log m).
+     #
+     # @param keys iterable of keys, in any order.
+     # @return list of nodes (None for keys not found), in the order of the keys.
+     #
+    def find_many(self, keys):
+        keys = list(keys)
+        size = len(self)
+        if not self.hasNaturalOrder() or \
+           len(keys) * max(1, size.bit_length()) < 4 * size:
+            return [self.findEntry(k) for k in keys]
+
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        result = [None] * len(keys)
+        i = 0
+
+        # nodes whose left subtree is being walked
+        stack = []
+        n = self.root()
+        while i < len(order) and (stack or n is not None):
+            if n is not None:
+                stack.append(n)
+                n = n.left
+                continue
+
+            n = stack.pop()
+            while i < len(order) and keys[order[i]] < n.key:
+                i += 1
+            while i < len(order) and not n.key < keys[order[i]]:
+                result[order[i]] = n
+                i += 1
+            n = n.right
+        return result
+
     ## Returns the number of elements in this tree.
     def __len__(self):
         return self.__size
 
+    ##
+     # Returns whether two trees hold the same keys.
+     # The trees are compared in lock-step, stopping at the first difference.
+     #
+     # @param other another tree.
+     #
+    def __eq__(self, other):
+        if not isinstance(other, BSTSet):
+            return NotImplemented
+        if len(self) != len(other):
+            return False
+        for a, b in zip(self.iterKeys(), other.iterKeys()):
+            if a != b:
+                return False
+        return True
+
+    ##
+     # Returns whether every key of this tree is in another collection.
+     # Both are walked in lock-step, stopping at the first key of this tree
+     # that is missing, and trees with more keys than other are rejected
+     # by their lengths alone.
+     #
+     # @param other a tree, or any iterable of elements.
+     #
+    def issubset(self, other):
+        other = self.__sortedKeys(other)
+        if len(self) > len(other):
+            return False
+        return self.__walkSubset(self.iterKeys(), other)
+
+    ##
+     # Returns whether every key of another collection is in this tree.
+     #
+     # @param other a tree, or any iterable of elements.
+     #
+    def issuperset(self, other):
+        other = self.__sortedKeys(other)
+        if len(other) > len(self):
+            return False
+        return self.__walkSubset(other, self.iterKeys())
+
+    ##
+     # Returns whether this tree and another collection have no keys in common.
+     # Both are walked in lock-step, stopping at the first common key.
+     #
+     # @param other a tree, or any iterable of elements.
+     #
+    def isdisjoint(self, other):
+        it1 = self.iterKeys()
+        it2 = iter(self.__sortedKeys(other))
+        a = next(it1, None)
+        b = next(it2, None)
+        while a is not None and b is not None:
+            if a < b:
+                a = next(it1, None)
+            elif b < a:
+                b = next(it2, None)
+            else:
+                return False
+        return True
+
+    ## Subset operator <=.
+    def __le__(self, other):
+        if not isinstance(other, BSTSet):
+            return NotImplemented
+        return self.issubset(other)
+
+    ## Superset operator >=.
+    def __ge__(self, other):
+        if not isinstance(other, BSTSet):
+            return NotImplemented
+        return self.issuperset(other)
+
+    ## Proper subset operator <.
+    def __lt__(self, other):
+        if not isinstance(other, BSTSet):
+            return NotImplemented
+        return len(self) < len(other) and self.issubset(other)
+
+    ## Proper superset operator >.
+    def __gt__(self, other):
+        if not isinstance(other, BSTSet):
+            return NotImplemented
+        return len(self) > len(other) and self.issuperset(other)
+
+    ##
+     # Returns whether all keys of an ordered sequence are in another one,
+     # walking both in lock-step.
+     #
+     # @param small ordered sequence of distinct keys.
+     # @param big ordered sequence of distinct keys.
+     # @return False as soon as a key of small is found to be missing from big.
+     #
+    @staticmethod
+    def __walkSubset(small, big):
+        it = iter(big)
+        for a in small:
+            # skip the keys of big smaller than a
+            for b in it:
+                if not b < a:
+                    break
+            else:
+                return False
+            if a < b:
+                return False
+        return True
+
+    ##
+     # Returns the keys of a tree, or the sorted distinct keys of the
+     # elements of any other iterable, under the key function of this tree.
+     #
+     # @param other a tree, or any iterable of elements.
+     # @return a sized iterable of keys in ascending order.
+     #
+    def __sortedKeys(self, other):
+        if isinstance(other, BSTSet):
+            return other if other.key is None else list(other.iterKeys())
+        keys = sorted(other if self.key is None else map(self.key, other))
+        return [k for i, k in enumerate(keys) if i == 0 or keys[i-1] < k]
+
     ## Returns an array containing all of the elements in this tree. 
      # If the collection makes any guarantees as to what order its elements 
      # are returned by its iterator, this method must return the elements in the same order. 
@@ -288,20 +824,61 @@ class BSTSet(object):
             arr.append(n)
         return arr
 
+    ##
+     # Returns an immutable copy of this tree, laid out for fast lookups.
+     # NumPy is only needed when this method is called.
+     #
+     # @return a FrozenBSTSet holding the keys of this tree.
+     # @see FrozenBSTSet
+     # @throw ValueError if the tree has a key function, since only
+     #        the keys could be frozen, not the elements, or if the keys
+     #        are not scalars.
+     #
+    def freeze(self):
+        if self.key is not None:
+            raise ValueError("a tree with a key function cannot be frozen")
+        from FrozenBSTSet import FrozenBSTSet
+        return FrozenBSTSet(self)
+
     ## Indexing operator [].
+     # Negative indices count from the largest element, and a slice
+     # returns a lazy iterator over the selected elements.
      # 
      # @throw IndexError.
-     # @param ind index to retrieve.
+     # @param ind index or slice to retrieve.
      # @return ind-ith value in the tree, or an exception.
      #
     def __getitem__(self, ind):
-        if ind < 0 or ind >= self.__size:
+        if isinstance(ind, slice):
+           return self.__sliceIter(ind)
+
+        if ind < 0:
+           ind += len(self)
+        if ind < 0 or ind >= len(self):
            raise IndexError
 
         for i,n in enumerate(self.iterator()):
             if i == ind:
                return n
 
+    ## Generator for the elements selected by a slice.
+     # Nodes have no subtree sizes, so the elements before the slice
+     # are skipped by the iterator, but never stored.
+     #
+     # @param s slice object.
+     #
+    def __sliceIter(self, s):
+        r = range(*s.indices(len(self)))
+        if not r:
+           return
+        if r.step > 0:
+           for n in islice(self.iterator(), r.start, r.stop, r.step):
+               yield n
+        else:
+           # visit the selected elements in ascending order, and yield them backwards
+           for n in reversed(list(islice(self.iterator(), r[-1], r[0] + 1, -r.step))):
+               yield n
+
     ## Iterator as a generator.
      #
      # Generators are functions having an yield keyword. 
@@ -317,6 +894,22 @@ class BSTSet(object):
         for n in self.iterator():
             yield n
 
+    ## Iterator over the keys in ascending order, which are the elements
+     # themselves unless the tree has a key function.
+    def iterKeys(self):
+        n = self.firstEntry()
+        while n is not None:
+            yield n.key
+            n = self.successor(n)
+
+    ## Reverse iterator as a generator, from the largest to the smallest key.
+    def __reversed__(self):
+        c = self.cursor()
+        c.last()
+        while c.isValid():
+            yield c.key
+            c.prev()
+
     ## Return the height of this tree.
      # The height of a tree is the height of its root node.
      #
@@ -458,6 +1051,133 @@ class BSTSet(object):
             self.__tree.unlinkNode(self.__pending)
             self.__pending = None
 
+    ##
+     # Bidirectional cursor for this binary search tree.
+     # The cursor holds a position in the tree, that can be moved
+     # to any key by seek(), or to its neighbours by next() and prev().
+     # Moving to a neighbour follows the parent pointers, taking O(1)
+     # amortized time. Once moved past either end, the cursor is invalid
+     # until it is repositioned by seek(), first() or last().
+     #
+    class Cursor(object):
+        ##
+         # Constructs a cursor at the smallest element of a tree.
+         #
+         # @param tree tree to be traversed.
+         #
+        def __init__(self, tree):
+            ## The tree to be traversed.
+            self.__tree = tree
+
+            ## Node at the current position, or None if invalid.
+            self.__node = tree.firstEntry()
+
+        ## Key at the current position, or None if the cursor is invalid.
+        @property
+        def key(self):
+            if self.__node is None:
+               return None
+            return self.__node.data
+
+        ## Node at the current position, or None if the cursor is invalid.
+        def node(self):
+            return self.__node
+
+        ## Whether the cursor is at a key of the tree.
+        def isValid(self):
+            return self.__node is not None
+
+        ## Moves to the smallest key, and returns it.
+        def first(self):
+            self.__node = self.__tree.firstEntry()
+            return self.key
+
+        ## Moves to the largest key, and returns it.
+        def last(self):
+            self.__node = self.__tree.lastEntry()
+            return self.key
+
+        ##
+         # Moves to the smallest key greater than or equal to a given key.
+         #
+         # @param key given key.
+         # @return True if the cursor is at a key equal to the given key.
+         #
+        def seek(self, key):
+            self.__node = self.__tree.ceilingEntry(key)
+            return self.__node is not None and self.__node.compareTo(key) == 0
+
+        ##
+         # Moves forward to the smallest key greater than or equal to a given key.
+         # Instead of descending from the root, the cursor climbs from the
+         # current node up to the first ancestor whose subtree can hold the key,
+         # and descends from there. A move costs O(height) even when it passes
+         # few keys, since the climb may reach the root, so m ascending seeks
+         # cost O(m log n) on a balanced tree.
+         # The cursor does not move backwards if key is smaller than its key.
+         #
+         # @param key given key.
+         # @return True if the cursor is at a key equal to the given key.
+         #
+        def seekForward(self, key):
+            n = self.__node
+            if n is None:
+               return False
+            comp = n.compareTo(key)
+            if comp >= 0:
+               return comp == 0
+
+            # the ancestors smaller than key are passed by; then n is either
+            # the root or the left child of a node greater than or equal to key
+            while n.parent is not None and n.parent.compareTo(key) < 0:
+                n = n.parent
+            best = n.parent
+
+            current = n
+            while current is not None:
+                comp = current.compareTo(key)
+                if comp == 0:
+                   best = current
+                   break
+                elif comp > 0:
+                   best = current
+                   current = current.left
+                else:
+                   current = current.right
+
+            self.__node = best
+            return best is not None and best.compareTo(key) == 0
+
+        ## Moves to the next key, and returns it (None past the end).
+        def next(self):
+            if self.__node is not None:
+               self.__node = self.__tree.successor(self.__node)
+            return self.key
+
+        ## Moves to the previous key, and returns it (None before the beginning).
+        def prev(self):
+            if self.__node is not None:
+               self.__node = self.__tree.predecessor(self.__node)
+            return self.key
+
+## Keyed node types made by keyedNode(), by node type.
+keyedNodes = {}
+
+##
+ #  Returns a subclass of a node type with a slot for the key of the node,
+ #  for the trees given a key function. The subclass is made once per
+ #  node type, so the nodes of other trees stay as small as before.
+ #
+ #  @param nodeType node type of a tree.
+ #  @return subclass of nodeType adding the key slot.
+ #
+def keyedNode(nodeType):
+    keyed = keyedNodes.get(nodeType)
+    if keyed is None:
+        keyed = type("Keyed" + nodeType.__name__, (nodeType,), {'__slots__': ('key',)})
+        keyedNodes[nodeType] = keyed
+    return keyed
+
 ## 
  #  Generates an array with a random size,
  #  filled with random elements.
@@ -12,15 +12,19 @@
 
 from __future__ import print_function
 
+import heapq
 import math
+import os
 import sys
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
 from BSTSet import cmp, BSTSet, generateRandomArray
 try:
-    from peekable import peekable
+    import numpy as np
 except ImportError:
-    ## return an iterator for a BSTSet .
-    def peekable(it):
-        return it.iterator()
+    np = None
 
 ##
 # Balanced Binary search tree implementation of the Collections interface.
@@ -43,6 +47,9 @@ class BalancedBSTSet(BSTSet):
     #
     class Node(BSTSet.Node):
 
+        ## Only the counter is added to the slots of BSTSet.Node.
+        __slots__ = ('counter',)
+
         ##  Constructor given a data object and the parent of this node.
         #
         #  @param key data object.
@@ -50,7 +57,8 @@ class BalancedBSTSet(BSTSet):
         def __init__(self, key, parent):
 
             ## Counter contains the number of nodes of the subtree starting in this node.
-            self.counter = 0
+            #  A new node is always a leaf, so its subtree holds only itself.
+            self.counter = 1
             super().__init__(key, parent)
 
     ## For self-balacing bst, alpha is the criterion used to rebalance the tree.
@@ -61,8 +69,9 @@ class BalancedBSTSet(BSTSet):
     # @param isSelfBalancing indicates whether or not it is a self-balacing tree
     # @param top alpha fraction enumerator
     # @param bottom alpha fraction denominator
-    def __init__(self, isSelfBalancing=False, top =0, bottom =0):
-        super().__init__()
+    # @param key function giving the key that orders the elements, or None
+    def __init__(self, isSelfBalancing=False, top =0, bottom =0, key=None):
+        super().__init__(key=key)
         ## stores whether or not this is a self-balancing tree
         self.self_balancing = isSelfBalancing
 
@@ -81,6 +90,56 @@ class BalancedBSTSet(BSTSet):
         ## Number of elements in this tree
         self.__size = 0
 
+        ## Whether every node is known to be balanced, which split and join
+        #  rely on. Set when the whole tree is built by build_tree, and
+        #  cleared when a counter update leaves a node unbalanced.
+        self.__weight_balanced = True
+
+        ## Largest number of elements since the whole tree was last rebuilt,
+        #  for the scapegoat deletion rule.
+        self.__max_size = 0
+
+    ##
+    # Builds a perfectly balanced tree from keys given in ascending order,
+    # in linear time, without any comparison other than the order check.
+    # Repeated keys are stored only once.
+    #
+    # @param iterable keys in ascending order.
+    # @param isSelfBalancing indicates whether or not it is a self-balacing tree
+    # @param top alpha fraction enumerator
+    # @param bottom alpha fraction denominator
+    # @param key function giving the key that orders the elements, or None
+    # @return a new tree holding the given keys.
+    # @throw ValueError if the keys are not in ascending order.
+    #
+    @classmethod
+    def from_sorted(cls, iterable, isSelfBalancing=False, top=0, bottom=0, key=None):
+        tree = cls(isSelfBalancing, top, bottom, key)
+        nodes = tree.__sorted_nodes(iterable)
+        tree.__root = tree.build_tree(nodes, None)
+        tree.__size = tree.__max_size = len(nodes)
+        return tree
+
+    ##
+    # Creates one unlinked node for each distinct key of an ordered sequence.
+    #
+    # @param keys keys in ascending order.
+    # @return list of new nodes, in the same order.
+    # @throw ValueError if the keys are not in ascending order.
+    #
+    def __sorted_nodes(self, keys):
+        nodes = []
+        for key in keys:
+            node = self.newNode(key, None)
+            if nodes:
+                comp = nodes[-1].compareTo(node.key)
+                if comp == 0:
+                    continue
+                if comp > 0:
+                    raise ValueError("keys are not in ascending order")
+            nodes.append(node)
+        return nodes
+
     ##
     # Returns a read-only view of the root node of this tree.
     # @return root node of this tree.
@@ -102,10 +161,17 @@ class BalancedBSTSet(BSTSet):
     def __inOrder(self, node, arr):
         if arr is None:
             arr = []
-        if node is not None:
-            self.__inOrder(node.left, arr)
-            arr.append(node)
-            self.__inOrder(node.right, arr)
+
+        # nodes whose left subtree is being visited
+        stack = []
+        while stack or node is not None:
+            if node is not None:
+                stack.append(node)
+                node = node.left
+            else:
+                node = stack.pop()
+                arr.append(node)
+                node = node.right
 
         return arr
 
@@ -118,75 +184,191 @@ class BalancedBSTSet(BSTSet):
     #
     def add(self, key):
         if self.__root is None:
-            self.__root = self.Node(key, None)
-            self.__size += 1
-            self.count_node(self.__root)
+            self.__root = self.newNode(key, None)
+            self.__size = self.__max_size = 1
             return True
 
+        obj, key = key, self.sortKey(key)
+        # depth of current, the root is at depth zero
+        depth = 0
         current = self.__root
-        while True:
-            comp = current.compareTo(key)
-            if comp == 0:
-                # key is already in the tree
-                return False
-            elif comp > 0:
-                if current.left is not None:
+        if self.hasNaturalOrder():
+            # single "<" per level, see BSTSet.add
+            candidate = None
+            while True:
+                if key < current.key:
+                    if current.left is None:
+                        break
                     current = current.left
                 else:
-                    current.left = self.Node(key, current)
-                    self.__size += 1
-
-                    # updates all tree counters
-                    self.count_node(self.__root)
-
-                    # rebalance tree if it is a self-balacing tree
-                    if self.self_balancing:
-                        unbalanced_node = self.find_unbalanced(current)
-                        if unbalanced_node is not None:
-                            self.rebalance(unbalanced_node)
-                    return True
-            else:
-                if current.right is not None:
+                    candidate = current
+                    if current.right is None:
+                        break
                     current = current.right
-                else:
-                    current.right = self.Node(key, current)
-                    self.__size += 1
+                depth += 1
 
-                    # updates all tree counters
-                    self.count_node(self.__root)
+            if candidate is not None and not candidate.key < key:
+                # key is already in the tree
+                return False
+            if candidate is current:
+                current.right = self.newNode(obj, current)
+            else:
+                current.left = self.newNode(obj, current)
 
-                    # rebalance tree if it is a self-balacing tree
-                    if self.self_balancing:
-                        unbalanced_node = self.find_unbalanced(current)
-                        if unbalanced_node is not None:
-                            self.rebalance(unbalanced_node)
-                    return True
+        else:
+            while True:
+                comp = current.compareTo(key)
+                if comp == 0:
+                    # key is already in the tree
+                    return False
+                elif comp > 0:
+                    if current.left is not None:
+                        current = current.left
+                    else:
+                        current.left = self.newNode(obj, current)
+                        break
+                else:
+                    if current.right is not None:
+                        current = current.right
+                    else:
+                        current.right = self.newNode(obj, current)
+                        break
+                depth += 1
+
+        self.__size += 1
+        self.__max_size = max(self.__max_size, self.__size)
+
+        # updates the counters on the search path
+        self.update_counters(current, 1)
+
+        # rebalance tree if it is a self-balacing tree and the new node
+        # is deeper than the scapegoat bound
+        if self.self_balancing and self.is_too_deep(depth + 1):
+            unbalanced_node = self.find_unbalanced(current)
+            if unbalanced_node is not None:
+                self.rebalance(unbalanced_node)
+        return True
+
+    ##
+    # Adds an iterable to the tree.
+    # A small batch is inserted one key at a time. Otherwise, which includes
+    # any batch into an empty tree, it is merged in by merge_in, when the
+    # m log n cost of the insertions would exceed the n cost of a rebuild.
+    #
+    # @param lst iterable of keys, in any order.
+    #
+    def update(self, lst):
+        batch = list(lst)
+        n = self.__size
+        if n > 0 and len(batch) * n.bit_length() < n:
+            for key in batch:
+                self.add(key)
+        else:
+            self.merge_in(batch)
 
+    ##
+    # Merges a batch of keys into this tree.
+    # The batch is sorted and merged with the in-order sequence of the
+    # existing nodes, which are reused, and the whole tree is rebuilt
+    # once by build_tree, in O(n + m log m) time.
+    #
+    # @param iterable keys to be added, in any order.
+    # @return number of keys actually added.
+    #
+    def merge_in(self, iterable):
+        batch = sorted(iterable, key=self.key)
+        old = self.__inOrder(self.__root, None)
+        nodes = []
+        i = 0
+        for obj in batch:
+            key = self.sortKey(obj)
+            # existing nodes smaller than key come first
+            while i < len(old) and old[i].compareTo(key) < 0:
+                nodes.append(old[i])
+                i += 1
+
+            # key is already in the tree, or repeated in the batch
+            if i < len(old) and old[i].compareTo(key) == 0:
+                continue
+            if nodes and nodes[-1].compareTo(key) == 0:
+                continue
+            nodes.append(self.newNode(obj, None))
+        nodes.extend(old[i:])
+
+        added = len(nodes) - self.__size
+        self.__root = self.build_tree(nodes, None)
+        self.__size = self.__max_size = len(nodes)
+        self.__weight_balanced = True
+        return added
 
     ##
     # Removes the given object from this tree.
+    # A self-balancing tree follows the scapegoat deletion rule, and is
+    # rebuilt whole when it gets too small, see is_too_small.
     #
     # @param obj given object.
     # @return True if the object was found, and False otherwise.
     #
     def remove(self, obj):
-        n = self.findEntry(obj)
+        n = self.findEntry(self.sortKey(obj))
         if n is None:
             return False
-        parent = n.parent
 
+        # counters are updated by unlinkNode
         self.unlinkNode(n)
-        # updates all tree counters
-        self.count_node(self.__root)
 
-        # rebalance tree if it is a self-balacing tree
-        if self.self_balancing:
-            unbalanced_node = self.find_unbalanced(parent)
-            if unbalanced_node is not None:
-                self.rebalance(unbalanced_node)
+        if self.self_balancing and self.is_too_small():
+            self.rebalance(self.__root)
 
         return True
 
+    ##
+    # Removes a batch of keys from this tree.
+    # When the m log n cost of the removals would exceed the n cost of a
+    # rebuild, the nodes are filtered by a merge with the sorted batch and
+    # the whole tree is rebuilt once. Otherwise the nodes are found by
+    # find_many() and unlinked from the largest key down, so the successor
+    # moved by a two-child unlink is never a node still to be removed, and
+    # the scapegoat deletion rule is checked once at the end.
+    #
+    # @param keys iterable of elements, in any order.
+    # @return number of keys actually removed.
+    #
+    def remove_many(self, keys):
+        # only the order of the keys is needed, as in BSTSet.__sortedKeys
+        batch = sorted(map(self.sortKey, keys))
+        batch = [k for i, k in enumerate(batch) if i == 0 or batch[i-1] < k]
+        n = self.__size
+        if n == 0 or not batch:
+            return 0
+
+        if len(batch) * n.bit_length() >= n:
+            old = self.__inOrder(self.__root, None)
+            nodes = []
+            i = 0
+            for node in old:
+                # keys of the batch smaller than node are not in the tree
+                while i < len(batch) and node.compareTo(batch[i]) > 0:
+                    i += 1
+                if i < len(batch) and node.compareTo(batch[i]) == 0:
+                    continue
+                nodes.append(node)
+
+            self.__root = self.build_tree(nodes, None)
+            self.__size = self.__max_size = len(nodes)
+            self.__weight_balanced = True
+            return n - len(nodes)
+
+        # counters are updated by unlinkNode
+        found = [node for node in self.find_many(batch) if node is not None]
+        for node in reversed(found):
+            self.unlinkNode(node)
+
+        if self.self_balancing and self.is_too_small():
+            self.rebalance(self.__root)
+
+        return len(found)
+
     ##
     # Returns the node containing key, or None if the key is not
     # found in the tree.
@@ -195,6 +377,19 @@ class BalancedBSTSet(BSTSet):
     #
     def findEntry(self, key):
         current = self.__root
+        if self.hasNaturalOrder():
+            # last node passed to the right, the only one that may hold key
+            candidate = None
+            while current is not None:
+                if key < current.key:
+                    current = current.left
+                else:
+                    candidate = current
+                    current = current.right
+            if candidate is not None and not candidate.key < key:
+                return candidate
+            return None
+
         while current is not None:
             comp = current.compareTo(key)
             if comp == 0:
@@ -209,8 +404,10 @@ class BalancedBSTSet(BSTSet):
     ##
     # Removes the given node, preserving the binary search
     # tree property of the tree.
+    # The counters of all ancestors of the node actually unlinked are decremented.
     #
     # @param n node to be removed.
+    # @return parent of the node actually unlinked, or None if it was the root.
     #
     def unlinkNode(self, n):
         # first deal with the two-child case copy
@@ -220,6 +417,7 @@ class BalancedBSTSet(BSTSet):
         if n.left is not None and n.right is not None:
             s = self.successor(n)
             n.data = s.data
+            n.key = s.key
             n = s  # causes s to be deleted in code below
             startNode = s.parent
 
@@ -244,6 +442,8 @@ class BalancedBSTSet(BSTSet):
             replacement.parent = n.parent
 
         self.__size -= 1
+        self.update_counters(n.parent, -1)
+        return n.parent
 
     ## Returns an iterator for this tree.
     def iterator(self):
@@ -256,18 +456,148 @@ class BalancedBSTSet(BSTSet):
 
 
     ## Indexing operator [].
+    # The position is found by descending the subtree counters, in O(log n).
+    # Negative indices count from the largest element, and a slice
+    # returns a lazy iterator over the selected elements.
     #
     # @throw IndexError.
-    # @param ind index to retrieve.
+    # @param ind index or slice to retrieve.
     # @return ind-ith value in the tree, or an exception.
     #
     def __getitem__(self, ind):
+        if isinstance(ind, slice):
+            return self.__slice_iter(ind)
+
+        if ind < 0:
+            ind += self.__size
         if ind < 0 or ind >= self.__size:
             raise IndexError
 
-        for i, n in enumerate(self.iterator()):
-            if i == ind:
-                return n
+        return self.select(ind).data
+
+    ##
+    # Returns the node holding the ind-th smallest element of this tree.
+    #
+    # @param ind index, between 0 and len - 1.
+    # @return the node at position ind, or None if ind is out of range.
+    #
+    def select(self, ind):
+        current = self.__root
+        while current is not None:
+            left = current.left.counter if current.left is not None else 0
+            if ind < left:
+                current = current.left
+            elif ind > left:
+                ind -= left + 1
+                current = current.right
+            else:
+                return current
+        return None
+
+    ##
+    # Returns the number of elements of this tree that are smaller than key,
+    # which is the index key has, or would have if it were added.
+    #
+    # @param key given object, not necessarily in the tree.
+    # @return rank of key.
+    #
+    def rank(self, key):
+        return self.bisect_left(key)
+
+    ##
+    # Returns the index where key would be inserted to keep the elements sorted,
+    # before any element equal to key, like bisect.bisect_left.
+    #
+    # @param key given object, not necessarily in the tree.
+    # @return number of elements smaller than key.
+    #
+    def bisect_left(self, key):
+        return self.__bisect(key, False)
+
+    ##
+    # Returns the index where key would be inserted to keep the elements sorted,
+    # after any element equal to key, like bisect.bisect_right.
+    #
+    # @param key given object, not necessarily in the tree.
+    # @return number of elements smaller than or equal to key.
+    #
+    def bisect_right(self, key):
+        return self.__bisect(key, True)
+
+    ##
+    # Returns the number of keys between lo and hi, from the ranks of the
+    # bounds, without visiting the keys in the range.
+    #
+    # @param lo lower bound, or None for no lower bound.
+    # @param hi upper bound, or None for no upper bound.
+    # @param inclusive pair telling whether lo and hi belong to the range.
+    # @return number of keys in the range.
+    #
+    def count_range(self, lo=None, hi=None, inclusive=(True, True)):
+        start = 0
+        if lo is not None:
+            start = self.bisect_left(lo) if inclusive[0] else self.bisect_right(lo)
+
+        end = self.__size
+        if hi is not None:
+            end = self.bisect_right(hi) if inclusive[1] else self.bisect_left(hi)
+
+        return max(0, end - start)
+
+    ##
+    # Follows the same descent as findEntry, adding up the counters of
+    # the left subtrees that are passed by on the way down.
+    #
+    # @param key given object.
+    # @param right whether an element equal to key is counted.
+    # @return number of elements smaller than (or equal to) key.
+    #
+    def __bisect(self, key, right):
+        ind = 0
+        current = self.__root
+        if self.hasNaturalOrder():
+            # a single "<" per level tells on which side the elements are counted
+            while current is not None:
+                if (not key < current.key) if right else current.key < key:
+                    ind += current.left.counter + 1 if current.left is not None else 1
+                    current = current.right
+                else:
+                    current = current.left
+            return ind
+
+        while current is not None:
+            comp = current.compareTo(key)
+            left = current.left.counter if current.left is not None else 0
+            if comp == 0:
+                return ind + left + 1 if right else ind + left
+            elif comp > 0:
+                current = current.left
+            else:
+                ind += left + 1
+                current = current.right
+        return ind
+
+    ## Generator for the elements selected by a slice.
+    # The first node is found with select(), and the following
+    # ones are reached through the successor of each node.
+    #
+    # @param s slice object.
+    #
+    def __slice_iter(self, s):
+        r = range(*s.indices(self.__size))
+        if not r:
+            return
+        if r.step < 0:
+            for i in r:
+                yield self.select(i).data
+            return
+
+        n = self.select(r.start)
+        for count in range(len(r) - 1, -1, -1):
+            yield n.data
+            if count:
+                for i in range(r.step):
+                    n = self.successor(n)
 
     ## Iterator as a generator.
     #
@@ -284,6 +614,27 @@ class BalancedBSTSet(BSTSet):
         for n in self.iterator():
             yield n
 
+    ##
+    # Exports the keys of this tree, in ascending order, to a contiguous
+    # NumPy array of integers, for the vectorized set operations.
+    #
+    # @return int64 array of keys, or None if NumPy is not available,
+    #         the keys are not integers or the tree has a key function.
+    #
+    def to_numpy(self):
+        if np is None or self.key is not None:
+            return None
+        if self.__root is None:
+            return np.empty(0, dtype=np.int64)
+
+        try:
+            keys = np.array([n.data for n in self.__inOrder(self.__root, None)])
+        except OverflowError:
+            return None
+        if keys.dtype.kind not in 'iu':
+            return None
+        return keys.astype(np.int64, copy=False)
+
     ## Return the height of this tree.
     # The height of a tree is the height of its root node.
     #
@@ -351,41 +702,21 @@ class BalancedBSTSet(BSTSet):
     #
     # @param bstNode root node of the subtree
     def rebalance(self, bstNode):
-
-        ## Reorganize the subtree recursively without creating another tree,
-        # returning it's new root node
-        #
-        # @param nodes ordered node list
-        # @param start initial index
-        # @param end end index
-        # @param parent node that will serve as root parent
-        # @return subtree root node
-        def rebuild_tree(nodes, start, end, parent):
-            if start > end:
-                return None
-
-            # finds midpoint that will serve as root for subtree
-            mid = int(math.ceil(start + (end - start) / 2.0))
-            node = nodes[mid]
-            node.parent = parent
-            node.left = rebuild_tree(nodes, start, mid - 1, node)
-            node.right = rebuild_tree(nodes, mid + 1, end, node)
-            return node
-
         # empty tree
         if bstNode is None:
             return
         node_parent = bstNode.parent
 
         # creates list of ordered nodes
-        node_list = []
-        self.__inOrder(bstNode, node_list)
+        node_list = self.__inOrder(bstNode, None)
 
-        subtree_root = rebuild_tree(node_list, 0, len(node_list)-1, bstNode.parent)
+        subtree_root = self.build_tree(node_list, node_parent)
 
         # bstNode was tree root
-        if subtree_root.parent is None:
+        if node_parent is None:
             self.__root = subtree_root
+            self.__max_size = self.__size
+            self.__weight_balanced = True
 
         # bstNode was left node
         elif node_parent.left == bstNode:
@@ -395,8 +726,47 @@ class BalancedBSTSet(BSTSet):
         else:
             node_parent.right = subtree_root
 
-        # update all tree counters
-        self.count_node(self.__root)
+    ##
+    # Reorganize an ordered list of nodes into a perfectly balanced subtree
+    # without creating new nodes, returning its root node.
+    # An explicit stack of index ranges is used instead of recursion, and the
+    # parent pointers and counters are set in the same pass, since the subtree
+    # built from a range has exactly as many nodes as the range.
+    #
+    # @param nodes ordered node list
+    # @param parent node that will serve as root parent
+    # @return subtree root node, or None if the list is empty
+    #
+    def build_tree(self, nodes, parent):
+        if not nodes:
+            return None
+
+        # the midpoint of each range serves as root for its subtree
+        end = len(nodes) - 1
+        mid = (end + 1) // 2
+        root = nodes[mid]
+        root.parent = parent
+        root.counter = end + 1
+
+        # ranges still to be linked: start, end, parent and side
+        stack = [(0, mid - 1, root, True), (mid + 1, end, root, False)]
+        while stack:
+            start, end, parent, is_left = stack.pop()
+            node = None
+            if start <= end:
+                mid = (start + end + 1) // 2
+                node = nodes[mid]
+                node.parent = parent
+                node.counter = end - start + 1
+                stack.append((start, mid - 1, node, True))
+                stack.append((mid + 1, end, node, False))
+
+            if is_left:
+                parent.left = node
+            else:
+                parent.right = node
+
+        return root
 
     ##
     # Recursively go upward in the tree from a given node until it finds a
@@ -413,6 +783,33 @@ class BalancedBSTSet(BSTSet):
             n = n.parent
         return n
 
+    ##
+    # Checks whether a node inserted at a given depth violates the scapegoat
+    # depth bound log_{1/alpha}(size), with alpha = top/bottom.
+    # A node deeper than the bound always has an ancestor that is not balanced,
+    # so the ancestors only need to be checked in this case.
+    #
+    # @param depth number of edges between the node and the root.
+    # @return True if depth is greater than the bound, and False otherwise.
+    #
+    def is_too_deep(self, depth):
+        if self.top >= self.bottom:
+            return False
+        if self.top == 0:
+            # alpha = 0 allows no depth at all
+            return depth > 0
+        return depth > math.log(self.__size, float(self.bottom) / self.top)
+
+    ##
+    # Checks the scapegoat deletion rule: whether the tree has shrunk below
+    # alpha times the largest size it had since it was last rebuilt whole.
+    # Rebuilding it then keeps the depth bound of is_too_deep, in amortized
+    # O(log n) time per removal, without looking at any ancestor.
+    #
+    # @return True if the whole tree should be rebuilt, and False otherwise.
+    #
+    def is_too_small(self):
+        return self.__size * self.bottom < self.__max_size * self.top
 
     ##
     # Checks if a subtree whose root is a given node is balanced.
@@ -463,6 +860,486 @@ class BalancedBSTSet(BSTSet):
 
         return current.counter
 
+    ##
+    # Adds delta to the counters of a given node and of all its ancestors.
+    # Used after a node is linked or unlinked, so that only the search path
+    # is visited instead of recounting the whole tree. While the tree is
+    # known to be weight-balanced, the ancestors are checked on the way.
+    #
+    # @param n deepest node whose subtree size changed.
+    # @param delta number of nodes added (positive) or removed (negative).
+    #
+    def update_counters(self, n, delta):
+        while n is not None:
+            n.counter += delta
+            if self.__weight_balanced and not self.is_balanced(n):
+                self.__weight_balanced = False
+            n = n.parent
+
+    ##
+    # Splits this tree by a given key, reusing its nodes.
+    # This tree is left empty. The nodes on the search path are joined back
+    # by rotations if the tree is weight-balanced, in O(log n), and otherwise
+    # just linked back in place, in O(height), neither tree getting higher.
+    #
+    # @param key given key, not necessarily in the tree.
+    # @return a tuple with a tree holding the keys smaller than key, the
+    #         element of this tree with that key (or None), and a tree
+    #         holding the keys greater than key.
+    #
+    def split(self, key):
+        balanced = self.__weight_balanced
+        l, found, r = self.__split(self.__root, key, self.__join if balanced else self.__link)
+        self.__root = None
+        self.__size = self.__max_size = 0
+        self.__weight_balanced = True
+        obj = found.data if found is not None else None
+        return self.__new_tree(l, balanced), obj, self.__new_tree(r, balanced)
+
+    ##
+    # Joins two trees and a key into a new tree, reusing their nodes.
+    # All keys of left must be smaller than key, and all keys of right greater.
+    # Both trees are left empty. Unless both are weight-balanced, the key
+    # becomes the root, over left and right.
+    #
+    # @param left tree with the smaller keys.
+    # @param key key between left and right.
+    # @param right tree with the greater keys.
+    # @return a tree holding the keys of left, key and the keys of right.
+    # @throw ValueError if the keys are not in order.
+    #
+    @classmethod
+    def join(cls, left, key, right):
+        tree = cls(left.self_balancing, left.top, left.bottom, left.key)
+        node = tree.newNode(key, None)
+        if (left.__root is not None and left.lastEntry().compareTo(node.key) >= 0) or \
+           (right.__root is not None and right.firstEntry().compareTo(node.key) <= 0):
+            raise ValueError("keys are not in order")
+
+        balanced = left.__weight_balanced and right.__weight_balanced
+        join = tree.__join if balanced else tree.__link
+        tree.__root = join(left.__root, node, right.__root)
+        tree.__size = tree.__max_size = left.__size + right.__size + 1
+        tree.__weight_balanced = balanced
+        for t in (left, right):
+            t.__root = None
+            t.__size = t.__max_size = 0
+            t.__weight_balanced = True
+        return tree
+
+    ##
+    # Adds all keys of an iterable to this tree, by splitting this tree
+    # at the keys of the iterable, which takes O(m log(n/m + 1)) time for
+    # a batch of m keys into a tree of n keys, plus O(m log m) to sort it.
+    # The splits need a weight-balanced tree: one shaped by insertions and
+    # removals gets the keys by update() instead.
+    #
+    # @param other iterable of keys.
+    #
+    def union_update(self, other):
+        if not self.__weight_balanced:
+            self.update(other)
+            return
+        self.__root = self.__union(self.__root, self.__copy(other))
+        self.__size = self.__max_size = self.__count(self.__root)
+
+    ##
+    # Removes from this tree all keys that are not in an iterable,
+    # in O(m log(n/m + 1)) time, plus O(m log m) to sort the iterable.
+    # A tree that is not weight-balanced is filtered and rebuilt instead,
+    # in O(n + m log m) time.
+    #
+    # @param other iterable of keys.
+    #
+    def intersection_update(self, other):
+        if not self.__weight_balanced:
+            self.__filter(other)
+            return
+        self.__root = self.__intersection(self.__root, self.__copy(other))
+        self.__size = self.__max_size = self.__count(self.__root)
+
+    ##
+    # Removes from this tree all keys that are in an iterable,
+    # in O(m log(n/m + 1)) time, plus O(m log m) to sort the iterable.
+    # The splits need a weight-balanced tree: the keys of one shaped by
+    # insertions and removals are removed by remove_many() instead.
+    #
+    # @param other iterable of keys.
+    #
+    def difference_update(self, other):
+        if not self.__weight_balanced:
+            self.remove_many(other)
+            return
+        self.__root = self.__difference(self.__root, self.__copy(other))
+        self.__size = self.__max_size = self.__count(self.__root)
+
+    ##
+    # Keeps only the nodes whose keys are in an iterable, merging the
+    # sorted keys with the in-order sequence of the nodes, and rebuilds
+    # the whole tree once.
+    #
+    # @param other iterable of keys.
+    #
+    def __filter(self, other):
+        batch = sorted(map(self.sortKey, other))
+        nodes = []
+        i = 0
+        for node in self.__inOrder(self.__root, None):
+            # keys of the batch smaller than node are not in the tree
+            while i < len(batch) and node.compareTo(batch[i]) > 0:
+                i += 1
+            if i < len(batch) and node.compareTo(batch[i]) == 0:
+                nodes.append(node)
+
+        self.__root = self.build_tree(nodes, None)
+        self.__size = self.__max_size = len(nodes)
+        self.__weight_balanced = True
+
+    ## Returns the number of nodes of a subtree, which may be empty.
+    @staticmethod
+    def __count(n):
+        return n.counter if n is not None else 0
+
+    ##
+    # Returns a tree with the same balancing criterion as this one,
+    # holding a given subtree.
+    #
+    # @param root root node of the subtree, or None.
+    # @param balanced whether every node of the subtree is known to be balanced.
+    #
+    def __new_tree(self, root, balanced):
+        tree = type(self)(self.self_balancing, self.top, self.bottom, self.key)
+        tree.__root = root
+        tree.__size = tree.__max_size = self.__count(root)
+        tree.__weight_balanced = balanced
+        return tree
+
+    ##
+    # Builds a balanced subtree with new nodes for the keys of an iterable.
+    #
+    # @param other iterable of keys.
+    # @return root of the subtree.
+    #
+    def __copy(self, other):
+        return self.build_tree(self.__sorted_nodes(sorted(other, key=self.key)), None)
+
+    ##
+    # Checks if a node with subtrees of the given sizes would be balanced.
+    #
+    # @param l size of the left subtree.
+    # @param r size of the right subtree.
+    #
+    def __fits(self, l, r):
+        size = l + r + 1
+        return l * self.bottom <= size * self.top and \
+               r * self.bottom <= size * self.top
+
+    ##
+    # Joins two detached subtrees and a node between them.
+    # If their sizes do not fit under a common node, the node is hung on the
+    # right spine of the larger left subtree (or on the left spine of the
+    # larger right subtree), and the spine is rebalanced by rotations.
+    #
+    # @param l root of the subtree with the smaller keys, or None.
+    # @param m node with the middle key.
+    # @param r root of the subtree with the greater keys, or None.
+    # @return root of the joined subtree.
+    # @see <a href="https://arxiv.org/abs/1602.02120">Just Join for Parallel Ordered Sets</a>
+    #
+    def __join(self, l, m, r):
+        for n in (l, r):
+            if n is not None:
+                n.parent = None
+
+        sl = self.__count(l)
+        sr = self.__count(r)
+        if self.__fits(sl, sr):
+            return self.__link(l, m, r)
+        elif sl > sr:
+            return self.__join_right(l, m, r)
+        else:
+            return self.__join_left(l, m, r)
+
+    ##
+    # Joins a node and a subtree r to the right spine of a larger subtree l.
+    #
+    # @param l root of the subtree with the smaller keys.
+    # @param m node with the middle key.
+    # @param r root of the subtree with the greater keys, or None.
+    # @return root of the joined subtree.
+    #
+    def __join_right(self, l, m, r):
+        sr = self.__count(r)
+        spine = []
+        c = l
+        while c is not None and not self.__fits(c.counter, sr):
+            spine.append(c)
+            c = c.right
+
+        t = self.__check(self.__link(c, m, r))
+        for p in reversed(spine):
+            p.right = t
+            t.parent = p
+            pl = self.__count(p.left)
+            p.counter = pl + t.counter + 1
+            if self.__fits(pl, t.counter):
+                t = p
+            elif self.__fits(pl, self.__count(t.left)) and \
+                 self.__fits(pl + self.__count(t.left) + 1, self.__count(t.right)):
+                t = self.__check(self.__rotate_left(p))
+            elif t.left is not None and self.__is_double_rotatable(p, t, t.left):
+                p.right = self.__rotate_right(t)
+                t = self.__check(self.__rotate_left(p))
+            else:
+                t = self.__rebuild(p)
+
+        t.parent = None
+        return t
+
+    ##
+    # Joins a node and a subtree l to the left spine of a larger subtree r.
+    #
+    # @param l root of the subtree with the smaller keys, or None.
+    # @param m node with the middle key.
+    # @param r root of the subtree with the greater keys.
+    # @return root of the joined subtree.
+    #
+    def __join_left(self, l, m, r):
+        sl = self.__count(l)
+        spine = []
+        c = r
+        while c is not None and not self.__fits(sl, c.counter):
+            spine.append(c)
+            c = c.left
+
+        t = self.__check(self.__link(l, m, c))
+        for p in reversed(spine):
+            p.left = t
+            t.parent = p
+            pr = self.__count(p.right)
+            p.counter = t.counter + pr + 1
+            if self.__fits(t.counter, pr):
+                t = p
+            elif self.__fits(self.__count(t.right), pr) and \
+                 self.__fits(self.__count(t.left), self.__count(t.right) + pr + 1):
+                t = self.__check(self.__rotate_right(p))
+            elif t.right is not None and self.__is_double_rotatable(p, t, t.right):
+                p.left = self.__rotate_left(t)
+                t = self.__check(self.__rotate_right(p))
+            else:
+                t = self.__rebuild(p)
+
+        t.parent = None
+        return t
+
+    ##
+    # Makes a node the root of two subtrees, setting its counter.
+    #
+    # @param l left subtree, or None.
+    # @param m node to become the root.
+    # @param r right subtree, or None.
+    # @return m.
+    #
+    def __link(self, l, m, r):
+        m.left = l
+        m.right = r
+        m.parent = None
+        m.counter = self.__count(l) + self.__count(r) + 1
+        for n in (l, r):
+            if n is not None:
+                n.parent = m
+        return m
+
+    ##
+    # Rotates a subtree to the left, its right child becoming its root.
+    #
+    # @param x root of the subtree.
+    # @return new root of the subtree.
+    #
+    def __rotate_left(self, x):
+        y = x.right
+        x.right = y.left
+        if y.left is not None:
+            y.left.parent = x
+        y.left = x
+        y.parent = x.parent
+        x.parent = y
+        x.counter = self.__count(x.left) + self.__count(x.right) + 1
+        y.counter = x.counter + self.__count(y.right) + 1
+        return y
+
+    ##
+    # Rotates a subtree to the right, its left child becoming its root.
+    #
+    # @param x root of the subtree.
+    # @return new root of the subtree.
+    #
+    def __rotate_right(self, x):
+        y = x.left
+        x.left = y.right
+        if y.right is not None:
+            y.right.parent = x
+        y.right = x
+        y.parent = x.parent
+        x.parent = y
+        x.counter = self.__count(x.left) + self.__count(x.right) + 1
+        y.counter = self.__count(y.left) + x.counter + 1
+        return y
+
+    ##
+    # Checks whether a double rotation at p brings a balanced result: the
+    # grandchild g becomes the root, with p and the child t below it.
+    # The rotation rules assume weight-balanced inputs, which trees shaped
+    # by insertions and removals are not, so this is checked every time.
+    #
+    # @param p node on the spine.
+    # @param t child of p on the spine side.
+    # @param g child of t on the inner side.
+    # @return True if the three resulting nodes are balanced.
+    #
+    def __is_double_rotatable(self, p, t, g):
+        if t is p.right:
+            outer_p, inner_p = self.__count(p.left), self.__count(g.left)
+            inner_t, outer_t = self.__count(g.right), self.__count(t.right)
+        else:
+            outer_p, inner_p = self.__count(p.right), self.__count(g.right)
+            inner_t, outer_t = self.__count(g.left), self.__count(t.left)
+        side_p = outer_p + inner_p + 1
+        side_t = inner_t + outer_t + 1
+        return self.__fits(outer_p, inner_p) and self.__fits(inner_t, outer_t) and \
+               self.__fits(side_p, side_t)
+
+    ##
+    # Rebuilds a subtree into a perfectly balanced one, keeping its parent.
+    #
+    # @param t root of a subtree.
+    # @return root of the rebuilt subtree.
+    #
+    def __rebuild(self, t):
+        return self.build_tree(self.__inOrder(t, None), t.parent)
+
+    ##
+    # Rotations keep the spine balanced only for alpha close to 1/2, so
+    # a subtree whose top nodes are still unbalanced after them is rebuilt.
+    #
+    # @param t root of a subtree.
+    # @return root of the subtree, rebuilt if needed.
+    #
+    def __check(self, t):
+        if self.is_balanced(t) and self.is_balanced(t.left) and self.is_balanced(t.right):
+            return t
+        return self.__rebuild(t)
+
+    ##
+    # Joins two detached subtrees, all keys of l being smaller than those
+    # of r, by splitting the largest node off l and joining around it.
+    #
+    # @param l root of the subtree with the smaller keys, or None.
+    # @param r root of the subtree with the greater keys, or None.
+    # @return root of the joined subtree.
+    #
+    def __join2(self, l, r):
+        if l is None:
+            if r is not None:
+                r.parent = None
+            return r
+
+        m = l
+        while m.right is not None:
+            m = m.right
+        l, m, empty = self.__split(l, m.key, self.__join)
+        return self.__join(l, m, r)
+
+    ##
+    # Splits a detached subtree by a given key, without recursion.
+    # The nodes on the search path are joined back, from the bottom up,
+    # with the subtrees hanging on the side away from the key.
+    #
+    # @param root root of the subtree, or None.
+    # @param key given key.
+    # @param join __join, or __link to keep the nodes where they are.
+    # @return a tuple with the root of the subtree of smaller keys, the node
+    #         holding key (or None), and the root of the subtree of greater keys.
+    #
+    def __split(self, root, key, join):
+        path = []
+        found = None
+        current = root
+        while current is not None:
+            comp = current.compareTo(key)
+            if comp == 0:
+                found = current
+                break
+            path.append((current, comp))
+            current = current.left if comp > 0 else current.right
+
+        l = r = None
+        if found is not None:
+            l, r = found.left, found.right
+            found.left = found.right = found.parent = None
+            found.counter = 1
+
+        for node, comp in reversed(path):
+            if comp > 0:
+                r = join(r, node, node.right)
+            else:
+                l = join(node.left, node, l)
+
+        for n in (l, r):
+            if n is not None:
+                n.parent = None
+        return l, found, r
+
+    ##
+    # Union of two detached subtrees: t1 is split at the root of t2,
+    # and both halves are merged recursively with the subtrees of t2.
+    # The nodes of t1 equal to keys of t2 are discarded.
+    #
+    # @param t1 root of the larger subtree, or None.
+    # @param t2 root of the smaller subtree, or None.
+    # @return root of the resulting subtree.
+    #
+    def __union(self, t1, t2):
+        if t1 is None:
+            return t2
+        if t2 is None:
+            return t1
+        left, right = t2.left, t2.right
+        l, found, r = self.__split(t1, t2.key, self.__join)
+        return self.__join(self.__union(l, left), t2, self.__union(r, right))
+
+    ##
+    # Intersection of two detached subtrees, keeping the nodes of t1.
+    #
+    # @param t1 root of the larger subtree, or None.
+    # @param t2 root of the smaller subtree, or None.
+    # @return root of the resulting subtree.
+    #
+    def __intersection(self, t1, t2):
+        if t1 is None or t2 is None:
+            return None
+        left, right = t2.left, t2.right
+        l, found, r = self.__split(t1, t2.key, self.__join)
+        l = self.__intersection(l, left)
+        r = self.__intersection(r, right)
+        if found is not None:
+            return self.__join(l, found, r)
+        return self.__join2(l, r)
+
+    ##
+    # Difference of two detached subtrees, keeping the nodes of t1.
+    #
+    # @param t1 root of the larger subtree, or None.
+    # @param t2 root of the smaller subtree, or None.
+    # @return root of the resulting subtree.
+    #
+    def __difference(self, t1, t2):
+        if t1 is None or t2 is None:
+            return t1
+        left, right = t2.left, t2.right
+        l, found, r = self.__split(t1, t2.key, self.__join)
+        return self.__join2(self.__difference(l, left), self.__difference(r, right))
+
     ##
     # Iterator implementation for this binary search tree. The elements
     # are returned in ascending order according to their natural ordering.
@@ -535,113 +1412,551 @@ class BalancedBSTSet(BSTSet):
         #
         def remove(self):
             if self.__pending is None: raise IndexError
-            parent = self.__pending.parent
             if self.__pending.left is not None and self.__pending.right is not None:
                 self.__current = self.__pending
 
+            # counters are updated by unlinkNode
             self.__tree.unlinkNode(self.__pending)
             self.__pending = None
 
-            # update all tree counters
-            self.__tree.count_node(self.__tree.__root)
+            # scapegoat deletion rule, see BalancedBSTSet.remove
+            tree = self.__tree
+            if tree.self_balancing and tree.is_too_small():
+                tree.rebalance(tree.root())
 
-            # rebalance tree if it is a self-balacing tree
-            if self.__tree.self_balancing:
-                unbalanced_node = self.__tree.find_unbalanced(parent)
-                if unbalanced_node is not None:
-                    self.__tree.rebalance(unbalanced_node)
 
 
+##
+# Builds the result of a set operation as a sequence of the same type as itr1.
+# Trees are built at once from the ordered keys by from_sorted, in linear
+# time, NumPy arrays are returned as arrays, and other sequences are filled
+# by append. A tree with a key function passes it on to the result.
+#
+# @param itr1 mutable ordered sequence that gives the result type
+# @param keys ordered keys of the result
+# @return mutable ordered sequence of type as itr1
+def build_result(itr1, keys):
+    if np is not None:
+        if isinstance(itr1, np.ndarray):
+            return keys if isinstance(keys, np.ndarray) else np.array(list(keys), dtype=itr1.dtype)
+        if isinstance(keys, np.ndarray):
+            keys = keys.tolist()
+
+    result_type = type(itr1)
+    if hasattr(result_type, 'from_sorted'):
+        key = key_function(itr1)
+        if key is not None:
+            return result_type.from_sorted(keys, key=key)
+        return result_type.from_sorted(keys)
+
+    result = result_type()
+    for key in keys:
+        result.append(key)
+    return result
 
-## set intersection given two mutable ordered sequences .
+##
+# Set intersection given two mutable ordered sequences, return a sequence of the same
+# type as itr1 containing all elements of itr1 that are also on itr2.
+# Both sequences are traversed once, in O(n + m) time.
+#
+# @param itr1 mutable ordered sequence
+# @param itr2 mutable ordered sequence
+# @return mutable ordered sequence of type as itr1
 # @see https://docs.python.org/3.0/library/stdtypes.html#mutable-sequence-types
 #
 def set_intersection(itr1, itr2):
-    p1 = peekable(itr1)
-    p2 = peekable(itr2)
-    result = type(itr1)()
-    while p1.hasNext() and p2.hasNext():
-        i1 = p1.peek()
-        i2 = p2.peek()
-        if i1 < i2:
-            next(p1)
-        elif i2 < i1:
-            next(p2)
-        else:
-            result.append(i1)
-            next(p1)
-            next(p2)
-    return result
+    arrays = numeric_arrays(itr1, itr2)
+    if arrays is not None:
+        return build_result(itr1, np.intersect1d(*arrays, assume_unique=True))
+    return build_result(itr1, iintersection(itr1, itr2, key_function(itr1, itr2)))
 
 ##
 # Set union given two mutable ordered sequences, return a sequence of the same
 # type as itr1 containing all elements of itr1 and itr2 that are not duplicates.
+# Both sequences are traversed once, in O(n + m) time.
 #
 # @param itr1 mutable ordered sequence
 # @param itr2 mutable ordered sequence
 # @return mutable ordered sequence of type as itr1
 
 def set_union(itr1, itr2):
-    p1 = peekable(itr1)
-    p2 = peekable(itr2)
-    result = type(itr1)()
-    while p1.hasNext() or p2.hasNext():
-        i1 = p1.peek()
-        i2 = p2.peek()
-
-        try:
-            if i1 < i2:
-                result.append(i1)
-                next(p1)
-            elif i2 < i1:
-                result.append(i2)
-                next(p2)
-            else:
-                result.append(i1)
-                next(p1)
-                next(p2)
-        except TypeError:
-            if p1.isLast() and not p2.isLast():
-                result.append(i2)
-                next(p2)
-            elif p2.isLast() and not p1.isLast():
-                result.append(i1)
-                next(p1)
-    return result
-
-
+    arrays = numeric_arrays(itr1, itr2)
+    if arrays is not None:
+        return build_result(itr1, numeric_union(*arrays))
+    return build_result(itr1, iunion(itr1, itr2, key_function(itr1, itr2)))
 
 ##
 # Set difference given two mutable ordered sequences, return a sequence of the same
 # type as itr1 containing all elements of itr1 that are not on itr2.
+# Both sequences are traversed once, in O(n + m) time.
 #
 # @param itr1 mutable ordered sequence
 # @param itr2 mutable ordered sequence
 # @return mutable ordered sequence of type as itr1
 def set_diff(itr1, itr2):
-    p1 = peekable(itr1)
-    result = type(itr1)()
-    flag = False
-
-    while p1.hasNext():
-        i1 = p1.peek()
-        p2 = peekable(itr2)
-        flag = False
-        while p2.hasNext():
-            i2 = p2.peek()
-            if i2 == i1:
-                flag = True
-                break
-            else:
-                next(p2)
+    arrays = numeric_arrays(itr1, itr2)
+    if arrays is not None:
+        return build_result(itr1, np.setdiff1d(*arrays, assume_unique=True))
+    return build_result(itr1, idiff(itr1, itr2, key_function(itr1, itr2)))
 
-        if not flag:
-            result.append(i1)
-        next(p1)
+##
+# Returns the key function of the trees among the operands of a set
+# operation, the first one taking precedence, or None if no tree has one.
+# The elements of the other operands are then ordered by it as well.
+#
+# @param itrs trees or ordered sequences
+def key_function(*itrs):
+    for itr in itrs:
+        if isinstance(itr, BSTSet) and itr.key is not None:
+            return itr.key
+    return None
 
+##
+# An element together with its key, ordered by the key alone, so that
+# the lazy set operations can merge elements that are not comparable.
+#
+class KeyedItem(object):
+    __slots__ = ('key', 'obj')
 
+    ## Pairs an element with its key.
+    def __init__(self, key, obj):
+        ## Key of the element.
+        self.key = key
+        ## The element.
+        self.obj = obj
+
+    ## Compares the keys with "<".
+    def __lt__(self, other):
+        return self.key < other.key
+
+    ## Compares the keys with "==".
+    def __eq__(self, other):
+        return self.key == other.key
+
+##
+# Runs a lazy set operation on the keys of the elements of two ordered
+# iterables, yielding the elements. The cached keys of trees are used.
+#
+# @param op lazy set operation
+# @param itr1 ordered iterable
+# @param itr2 ordered iterable
+# @param key key function ordering the elements
+def keyed_operation(op, itr1, itr2, key):
+    items = []
+    for itr in (itr1, itr2):
+        if isinstance(itr, BSTSet):
+            items.append(map(KeyedItem, itr.iterKeys(), itr))
+        else:
+            items.append(KeyedItem(key(obj), obj) for obj in itr)
+    for item in op(*items):
+        yield item.obj
+
+##
+# Returns both operands of a set operation as NumPy arrays, when either
+# operand already is an array, so the vectorized operations can be used.
+# Trees are left to the merges, since exporting their keys to arrays and
+# building the result back usually costs more than the merge saves; the
+# arrays from to_numpy() may be passed instead, to opt in.
+#
+# @param itr1 ordered sequence
+# @param itr2 ordered sequence
+# @return a list with two arrays, or None.
+# @throw TypeError if an array is combined with keys of another kind,
+#        numbers with strings for instance, which NumPy would coerce.
+def numeric_arrays(itr1, itr2):
+    if np is None or not (isinstance(itr1, np.ndarray) or isinstance(itr2, np.ndarray)):
+        return None
+
+    arrays = []
+    for itr in (itr1, itr2):
+        keys = None
+        if isinstance(itr, np.ndarray):
+            keys = itr
+        elif isinstance(itr, BalancedBSTSet):
+            keys = itr.to_numpy()
+        if keys is None:
+            keys = np.asarray(list(itr))
+        arrays.append(keys)
+
+    # an empty operand takes the type of the other one
+    for i in (0, 1):
+        if len(arrays[i]) == 0:
+            arrays[i] = np.empty(0, dtype=arrays[1 - i].dtype)
+
+    kinds = [a.dtype.kind for a in arrays]
+    numeric = [k in 'biuf' for k in kinds]
+    if numeric[0] != numeric[1] or 'O' in kinds or \
+       (not numeric[0] and kinds[0] != kinds[1]):
+        raise TypeError("set operation between %s and %s keys" %
+                        (arrays[0].dtype, arrays[1].dtype))
+    return arrays
+
+##
+# Union of two ordered NumPy arrays of distinct keys.
+# The stable sort (timsort) merges the two ordered runs of the concatenation
+# in linear time, and the repeated keys are then adjacent.
+#
+# @param a1 ordered array
+# @param a2 ordered array
+# @return ordered array with the keys of both arrays
+def numeric_union(a1, a2):
+    keys = np.concatenate((a1, a2))
+    keys.sort(kind='stable')
+    if len(keys) < 2:
+        return keys
+    keep = np.empty(len(keys), dtype=bool)
+    keep[0] = True
+    np.not_equal(keys[1:], keys[:-1], out=keep[1:])
+    return keys[keep]
+
+##
+# Whether the larger of two sizes is so much larger than the smaller
+# one that probing it m times is cheaper than merging both.
+#
+# @param m smaller size
+# @param n larger size
+def is_skewed(m, n):
+    return m * max(1, n.bit_length()) < n
+
+## Marks the end of a sequence in the lazy set operations.
+END = object()
+
+##
+# Lazy set intersection of two ordered iterables, yielding the
+# common keys in ascending order. Any of the lazy operations may be
+# given as an argument to another, without intermediate containers.
+#
+# @param itr1 ordered iterable
+# @param itr2 ordered iterable
+# @param key function ordering the elements, or None to compare them
+def iintersection(itr1, itr2, key=None):
+    if key is not None:
+        yield from keyed_operation(iintersection, itr1, itr2, key)
+        return
+
+    # when one side is much smaller, probing the other one is cheaper;
+    # both sides must hold Python objects, since cmp() in the descents
+    # fails on the booleans NumPy scalars compare to
+    sequences = (BSTSet, list, tuple)
+    if isinstance(itr1, sequences) and isinstance(itr2, sequences):
+        small, big = (itr1, itr2) if len(itr1) <= len(itr2) else (itr2, itr1)
+        if is_skewed(len(small), len(big)):
+            yield from igallop_intersection(small, big)
+            return
+
+    it1 = iter(itr1)
+    it2 = iter(itr2)
+    i1 = next(it1, END)
+    i2 = next(it2, END)
+    while i1 is not END and i2 is not END:
+        if i1 < i2:
+            i1 = next(it1, END)
+        elif i2 < i1:
+            i2 = next(it2, END)
+        else:
+            yield i1
+            i1 = next(it1, END)
+            i2 = next(it2, END)
+
+##
+# Lazy set intersection of a small ordered iterable and a large tree or
+# ordered list, in O(m log n) time. Each key of small is sought from the
+# position of the previous one: by Cursor.seekForward in a tree, or by
+# exponential search in a list.
+#
+# @param small ordered iterable of Python objects
+# @param big tree or ordered list
+def igallop_intersection(small, big):
+    if isinstance(big, BSTSet):
+        c = big.cursor()
+        for key in small:
+            if c.seekForward(key):
+                yield key
+            elif not c.isValid():
+                return
+    else:
+        i = 0
+        for key in small:
+            i = gallop_left(big, key, i)
+            if i == len(big):
+                return
+            if big[i] == key:
+                yield key
+
+##
+# Exponential search: returns where key would be inserted in an ordered
+# list, like bisect_left, looking only from position lo onwards.
+# Probes at distances 1, 2, 4, ... from lo bound the binary search,
+# so the cost is O(log d) for an answer d positions after lo.
+#
+# @param seq ordered list
+# @param key given key
+# @param lo position from which the search starts
+def gallop_left(seq, key, lo):
+    n = len(seq)
+    step = 1
+    hi = lo
+    while hi < n and seq[hi] < key:
+        lo = hi + 1
+        hi += step
+        step *= 2
+    return bisect_left(seq, key, lo, min(hi, n))
+
+##
+# Lazy set union of two ordered iterables, yielding the keys
+# of both in ascending order, without duplicates.
+#
+# @param itr1 ordered iterable
+# @param itr2 ordered iterable
+# @param key function ordering the elements, or None to compare them
+def iunion(itr1, itr2, key=None):
+    if key is not None:
+        yield from keyed_operation(iunion, itr1, itr2, key)
+        return
+
+    it1 = iter(itr1)
+    it2 = iter(itr2)
+    i1 = next(it1, END)
+    i2 = next(it2, END)
+    while i1 is not END and i2 is not END:
+        if i1 < i2:
+            yield i1
+            i1 = next(it1, END)
+        elif i2 < i1:
+            yield i2
+            i2 = next(it2, END)
+        else:
+            yield i1
+            i1 = next(it1, END)
+            i2 = next(it2, END)
+
+    # at most one of the iterables still has keys
+    if i1 is not END:
+        yield i1
+        yield from it1
+    if i2 is not END:
+        yield i2
+        yield from it2
+
+##
+# Lazy set difference of two ordered iterables, yielding the keys
+# of itr1 that are not in itr2, in ascending order.
+#
+# @param itr1 ordered iterable
+# @param itr2 ordered iterable
+# @param key function ordering the elements, or None to compare them
+def idiff(itr1, itr2, key=None):
+    if key is not None:
+        yield from keyed_operation(idiff, itr1, itr2, key)
+        return
+
+    it1 = iter(itr1)
+    it2 = iter(itr2)
+    i1 = next(it1, END)
+    i2 = next(it2, END)
+    while i1 is not END and i2 is not END:
+        if i1 < i2:
+            yield i1
+            i1 = next(it1, END)
+        elif i2 < i1:
+            i2 = next(it2, END)
+        else:
+            i1 = next(it1, END)
+            i2 = next(it2, END)
+
+    if i1 is not END:
+        yield i1
+        yield from it1
+
+##
+# Lazy symmetric difference of two ordered iterables, yielding the keys
+# that are in exactly one of them, in ascending order.
+#
+# @param itr1 ordered iterable
+# @param itr2 ordered iterable
+# @param key function ordering the elements, or None to compare them
+def isymmetric_difference(itr1, itr2, key=None):
+    if key is not None:
+        yield from keyed_operation(isymmetric_difference, itr1, itr2, key)
+        return
+
+    it1 = iter(itr1)
+    it2 = iter(itr2)
+    i1 = next(it1, END)
+    i2 = next(it2, END)
+    while i1 is not END and i2 is not END:
+        if i1 < i2:
+            yield i1
+            i1 = next(it1, END)
+        elif i2 < i1:
+            yield i2
+            i2 = next(it2, END)
+        else:
+            i1 = next(it1, END)
+            i2 = next(it2, END)
+
+    if i1 is not END:
+        yield i1
+        yield from it1
+    if i2 is not END:
+        yield i2
+        yield from it2
+
+##
+# Union of any number of ordered sequences, merged in a single pass
+# through a heap holding the next key of each sequence. The elements are
+# ordered by the key function of the first tree that has one, which the
+# result gets as well.
+#
+# @param sets trees or ordered sequences
+# @return BalancedBSTSet with all keys, built at once by from_sorted
+def union_all(*sets):
+    key = key_function(*sets)
+    return BalancedBSTSet.from_sorted(heapq.merge(*sets, key=key), key=key)
+
+##
+# Intersection of any number of ordered sequences. The keys of the
+# smallest sequence are probed in all the others, trees by findEntry and
+# lists by binary search, so the larger sequences are never traversed.
+# The elements are ordered by the key function of the first tree that
+# has one, which the result gets as well.
+#
+# @param sets trees or ordered sequences
+# @return BalancedBSTSet with the common keys, built at once by from_sorted
+def intersection_all(*sets):
+    key = key_function(*sets)
+    if not sets:
+        return BalancedBSTSet()
+
+    sets = sorted((s if hasattr(s, '__len__') else list(s) for s in sets), key=len)
+    probes = [membership(s, key) for s in sets[1:]]
+    elements = []
+    for obj in sets[0]:
+        if all(contains(obj) for contains in probes):
+            elements.append(obj)
+    return BalancedBSTSet.from_sorted(elements, key=key)
+
+##
+# Returns a function telling whether an element is in an ordered sequence.
+#
+# @param seq tree or ordered list
+# @param key function ordering the elements of a list, or None
+# @return membership function, O(log n) for trees and lists
+def membership(seq, key=None):
+    if isinstance(seq, BSTSet):
+        return seq.__contains__
+
+    def contains(obj):
+        if key is None:
+            i = bisect_left(seq, obj)
+            return i < len(seq) and not obj < seq[i]
+        k = key(obj)
+        i = bisect_left(seq, k, key=key)
+        return i < len(seq) and not k < key(seq[i])
+    return contains
+
+## Smallest total number of keys for which the parallel set operations use processes.
+PARALLEL_THRESHOLD = 100000
+
+##
+# Parallel set union, see parallel_set_operation.
+#
+# @param itr1 tree or ordered sequence
+# @param itr2 tree or ordered sequence
+# @param workers number of processes, by default the number of CPUs
+# @return sequence of type as itr1
+def parallel_set_union(itr1, itr2, workers=None):
+    return parallel_set_operation('union', itr1, itr2, workers)
+
+##
+# Parallel set intersection, see parallel_set_operation.
+#
+# @param itr1 tree or ordered sequence
+# @param itr2 tree or ordered sequence
+# @param workers number of processes, by default the number of CPUs
+# @return sequence of type as itr1
+def parallel_set_intersection(itr1, itr2, workers=None):
+    return parallel_set_operation('intersection', itr1, itr2, workers)
+
+##
+# Parallel set difference, see parallel_set_operation.
+#
+# @param itr1 tree or ordered sequence
+# @param itr2 tree or ordered sequence
+# @param workers number of processes, by default the number of CPUs
+# @return sequence of type as itr1
+def parallel_set_diff(itr1, itr2, workers=None):
+    return parallel_set_operation('diff', itr1, itr2, workers)
+
+##
+# Set operation split by key ranges among a pool of processes.
+# The keys at evenly spaced positions of the larger operand serve as
+# pivots, and each operand is cut at the ranks of the pivots, found by
+# bisect_left in O(log n). The keys of each range are shipped as compact
+# arrays to a ProcessPoolExecutor, which merges the ranges independently,
+# and the ordered results are concatenated and built at once.
+# Small inputs, a single worker, or trees with a key function, use the
+# sequential operations.
+#
+# @param name 'union', 'intersection' or 'diff'
+# @param itr1 BalancedBSTSet or ordered sequence supporting len and indexing
+# @param itr2 BalancedBSTSet or ordered sequence supporting len and indexing
+# @param workers number of processes, by default the number of CPUs
+# @return sequence of type as itr1
+def parallel_set_operation(name, itr1, itr2, workers=None):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 2 or len(itr1) + len(itr2) < PARALLEL_THRESHOLD or \
+       key_function(itr1, itr2) is not None:
+        sequential = {'union': set_union, 'intersection': set_intersection, 'diff': set_diff}
+        return sequential[name](itr1, itr2)
+
+    big = itr1 if len(itr1) >= len(itr2) else itr2
+    pivots = [big[i * len(big) // workers] for i in range(1, workers)]
+
+    chunks = []
+    for itr in (itr1, itr2):
+        cuts = [0] + [range_start(itr, p) for p in pivots] + [len(itr)]
+        chunks.append([key_chunk(itr, cuts[i], cuts[i+1]) for i in range(workers)])
+
+    with ProcessPoolExecutor(workers) as executor:
+        results = executor.map(merge_range, [name] * workers, chunks[0], chunks[1])
+        return build_result(itr1, chain.from_iterable(results))
+
+##
+# Returns the position of the first key not smaller than a pivot.
+#
+# @param itr BalancedBSTSet or ordered sequence
+# @param pivot given key
+def range_start(itr, pivot):
+    if isinstance(itr, BalancedBSTSet):
+        return itr.bisect_left(pivot)
+    return bisect_left(itr, pivot)
+
+##
+# Returns the keys between two positions of an ordered sequence as an
+# array of 64 bit integers, or as a list if they are not integers.
+#
+# @param itr BalancedBSTSet or ordered sequence
+# @param start position of the first key
+# @param end position after the last key
+def key_chunk(itr, start, end):
+    try:
+        return array('q', itr[start:end])
+    except (TypeError, OverflowError):
+        return list(itr[start:end])
+
+##
+# Worker of parallel_set_operation: merges the keys of one range.
+#
+# @param name 'union', 'intersection' or 'diff'
+# @param keys1 ordered keys of itr1 in the range
+# @param keys2 ordered keys of itr2 in the range
+# @return list of the resulting keys
+def merge_range(name, keys1, keys2):
+    lazy = {'union': iunion, 'intersection': iintersection, 'diff': idiff}
+    return list(lazy[name](keys1, keys2))
 
-    return result
 ##
 #  Main function for testing.
 #
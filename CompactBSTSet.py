@@ -0,0 +1,810 @@
+#!/usr/bin/env python
+# coding: UTF-8
+# vim: tabstop=4:softtabstop=4:shiftwidth=4
+#
+## @package CompactBSTSet
+#
+#  Balanced Binary Tree stored in parallel arrays.
+#
+
+from __future__ import print_function
+
+import math
+import sys
+from array import array
+from BSTSet import cmp, generateRandomArray
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+## Index standing for a missing node.
+NIL = -1
+
+##
+# Balanced binary search tree with the interface of BalancedBSTSet, whose
+# nodes are integer indices into parallel buffers instead of objects.
+#  - The keys are kept in a list, and the left, right and parent links and
+#    the subtree sizes in array('q') buffers, so a tree holds no per-node
+#    Python object besides its keys.
+#  - Removed slots are chained into a free list through the left buffer,
+#    and reused by the next insertions.
+#  - Rebuilds compute the balanced layout of a subtree as arrays of in-order
+#    positions, and scatter it through the permutation of node indices given
+#    by the in-order traversal, vectorized with NumPy when available.
+#
+#   Methods taking or returning a node use its index, and NIL for None.
+#
+#   To run:
+#      - python CompactBSTSet.py
+#
+#   @see <a href="http://en.wikipedia.org/wiki/Scapegoat_tree">Scapegoat tree</a>
+#   @see <a href="https://docs.python.org/3/library/array.html">Efficient arrays of numeric values</a>
+#
+class CompactBSTSet(object):
+
+    ## For self-balacing bst, alpha is the criterion used to rebalance the tree.
+    # If isSelfBalancing is True, builds a self balanced BST, and alpha = top/bottom
+    # If isSelfBalancing is False, top and bottom will be ignored
+    # if bottom is zero, top = 2 e bottom =3.
+    #
+    # @param isSelfBalancing indicates whether or not it is a self-balacing tree
+    # @param top alpha fraction enumerator
+    # @param bottom alpha fraction denominator
+    def __init__(self, isSelfBalancing=False, top=0, bottom=0):
+        ## stores whether or not this is a self-balancing tree
+        self.self_balancing = isSelfBalancing
+
+        if bottom == 0:
+            ## initialize bottom attribute
+            self.bottom = 3
+            ## initialize top attribute
+            self.top = 2
+        else:
+            self.top = top
+            self.bottom = bottom
+
+        ## Key of each slot, None for free slots.
+        self.__keys = []
+        ## Left child of each slot, or next free slot for free slots.
+        self.__left = array('q')
+        ## Right child of each slot.
+        self.__right = array('q')
+        ## Parent of each slot.
+        self.__parent = array('q')
+        ## Number of nodes of the subtree starting in each slot.
+        self.__counter = array('q')
+
+        ## First slot of the free list.
+        self.__free = NIL
+
+        ## Root of this tree
+        self.__root = NIL
+
+        ## Number of elements in this tree
+        self.__size = 0
+
+        ## Largest number of elements since the whole tree was last rebuilt,
+        #  for the scapegoat deletion rule.
+        self.__max_size = 0
+
+    ##
+    # Builds a perfectly balanced tree from keys given in ascending order,
+    # in linear time. Repeated keys are stored only once.
+    #
+    # @param iterable keys in ascending order.
+    # @param isSelfBalancing indicates whether or not it is a self-balacing tree
+    # @param top alpha fraction enumerator
+    # @param bottom alpha fraction denominator
+    # @return a new tree holding the given keys.
+    # @throw ValueError if the keys are not in ascending order.
+    #
+    @classmethod
+    def from_sorted(cls, iterable, isSelfBalancing=False, top=0, bottom=0):
+        tree = cls(isSelfBalancing, top, bottom)
+        for key in iterable:
+            if tree.__keys:
+                comp = cmp(tree.__keys[-1], key)
+                if comp == 0:
+                    continue
+                if comp > 0:
+                    raise ValueError("keys are not in ascending order")
+            tree.__new_node(key, NIL)
+
+        tree.__size = tree.__max_size = len(tree.__keys)
+        tree.__root = tree.build_tree(array('q', range(tree.__size)), NIL)
+        return tree
+
+    ##
+    # Returns a slot for a new leaf, taken from the free list if possible.
+    #
+    # @param key key of the new node.
+    # @param parent parent of the new node.
+    # @return index of the new node.
+    #
+    def __new_node(self, key, parent):
+        n = self.__free
+        if n == NIL:
+            n = len(self.__keys)
+            self.__keys.append(key)
+            self.__left.append(NIL)
+            self.__right.append(NIL)
+            self.__parent.append(parent)
+            self.__counter.append(1)
+            return n
+
+        self.__free = self.__left[n]
+        self.__keys[n] = key
+        self.__left[n] = NIL
+        self.__right[n] = NIL
+        self.__parent[n] = parent
+        self.__counter[n] = 1
+        return n
+
+    ##
+    # Puts a slot, no longer linked to the tree, on the free list.
+    #
+    # @param n index of the node.
+    #
+    def __free_node(self, n):
+        self.__keys[n] = None
+        self.__left[n] = self.__free
+        self.__right[n] = NIL
+        self.__parent[n] = NIL
+        self.__counter[n] = 0
+        self.__free = n
+
+    ##
+    # Returns the root node of this tree.
+    # @return index of the root, or NIL if the tree is empty.
+    #
+    def root(self):
+        return self.__root
+
+    ## Return whether this tree is empty.
+    def isEmpty(self):
+        return self.__root == NIL
+
+    ## Returns the key of a given node.
+    def data(self, n):
+        return self.__keys[n]
+
+    ## Returns the left child of a given node, or NIL.
+    def left(self, n):
+        return self.__left[n]
+
+    ## Returns the right child of a given node, or NIL.
+    def right(self, n):
+        return self.__right[n]
+
+    ## Returns the parent of a given node, or NIL.
+    def parent(self, n):
+        return self.__parent[n]
+
+    ## Returns the number of nodes of the subtree starting in a given node.
+    def counter(self, n):
+        return self.__counter[n] if n != NIL else 0
+
+    ##
+    #  Returns the nodes of the subtree rooted at a given node, in order.
+    #
+    #  @param node root.
+    #  @return array of node indices.
+    #
+    def __inOrder(self, node):
+        arr = array('q')
+        left = self.__left
+        right = self.__right
+
+        # nodes whose left subtree is being visited
+        stack = []
+        while stack or node != NIL:
+            if node != NIL:
+                stack.append(node)
+                node = left[node]
+            else:
+                node = stack.pop()
+                arr.append(node)
+                node = right[node]
+
+        return arr
+
+    ##
+    # Returns whether the given object is in this tree.
+    #
+    # @param obj given object.
+    # @return True if the object is in the tree, or False otherwise.
+    #
+    def __contains__(self, obj):
+        return self.findEntry(obj) != NIL
+
+    ##
+    # Adds the given object to this tree.
+    #
+    # @param key given object.
+    # @return True if the object was added, and False otherwise.
+    #
+    def add(self, key):
+        if self.__root == NIL:
+            self.__root = self.__new_node(key, NIL)
+            self.__size = self.__max_size = 1
+            return True
+
+        keys = self.__keys
+        # depth of current, the root is at depth zero
+        depth = 0
+        current = self.__root
+        # last node passed to the right, the only one that may hold key
+        candidate = NIL
+        while True:
+            if key < keys[current]:
+                child = self.__left
+            else:
+                candidate = current
+                child = self.__right
+            if child[current] == NIL:
+                break
+            current = child[current]
+            depth += 1
+
+        if candidate != NIL and not keys[candidate] < key:
+            # key is already in the tree
+            return False
+        child[current] = self.__new_node(key, current)
+
+        self.__size += 1
+        self.__max_size = max(self.__max_size, self.__size)
+
+        # updates the counters on the search path
+        self.update_counters(current, 1)
+
+        # rebalance tree if it is a self-balacing tree and the new node
+        # is deeper than the scapegoat bound
+        if self.self_balancing and self.is_too_deep(depth + 1):
+            unbalanced_node = self.find_unbalanced(current)
+            if unbalanced_node != NIL:
+                self.rebalance(unbalanced_node)
+        return True
+
+    ##
+    # Adds an iterable to the tree, one key at a time.
+    #
+    # @param lst iterable of keys.
+    #
+    def update(self, lst):
+        for key in lst:
+            self.add(key)
+
+    ##
+    # Removes the given object from this tree.
+    # A self-balancing tree follows the scapegoat deletion rule, and is
+    # rebuilt whole when it gets too small, see is_too_small.
+    #
+    # @param obj given object.
+    # @return True if the object was found, and False otherwise.
+    #
+    def remove(self, obj):
+        n = self.findEntry(obj)
+        if n == NIL:
+            return False
+
+        # counters are updated by unlinkNode
+        self.unlinkNode(n)
+
+        if self.self_balancing and self.is_too_small():
+            self.rebalance(self.__root)
+
+        return True
+
+    ##
+    # Returns the node containing key, or NIL if the key is not
+    # found in the tree.
+    # @param key
+    # @return the node containing key, or NIL if not found.
+    #
+    def findEntry(self, key):
+        keys = self.__keys
+        left = self.__left
+        right = self.__right
+        current = self.__root
+        # a single "<" per level, keeping the last node passed to the right
+        candidate = NIL
+        while current != NIL:
+            if key < keys[current]:
+                current = left[current]
+            else:
+                candidate = current
+                current = right[current]
+        if candidate != NIL and not keys[candidate] < key:
+            return candidate
+        return NIL
+
+    ##
+    # Returns the successor of the given node.
+    #
+    # @param n given node.
+    # @return the successor of the given node, or NIL.
+    #
+    def successor(self, n):
+        if n == NIL:
+            return NIL
+        if self.__right[n] != NIL:
+            # leftmost entry in right subtree
+            n = self.__right[n]
+            while self.__left[n] != NIL:
+                n = self.__left[n]
+            return n
+
+        # closest ancestor whose left subtree holds n
+        parent = self.__parent[n]
+        while parent != NIL and n == self.__right[parent]:
+            n = parent
+            parent = self.__parent[n]
+        return parent
+
+    ##
+    # Returns the predecessor of the given node.
+    #
+    # @param n given node.
+    # @return the predecessor of the given node, or NIL.
+    #
+    def predecessor(self, n):
+        if n == NIL:
+            return NIL
+        if self.__left[n] != NIL:
+            # rightmost entry in left subtree
+            n = self.__left[n]
+            while self.__right[n] != NIL:
+                n = self.__right[n]
+            return n
+
+        # closest ancestor whose right subtree holds n
+        parent = self.__parent[n]
+        while parent != NIL and n == self.__left[parent]:
+            n = parent
+            parent = self.__parent[n]
+        return parent
+
+    ##
+    # Removes the given node, preserving the binary search
+    # tree property of the tree, and frees its slot.
+    # The counters of all ancestors of the node actually unlinked are decremented.
+    #
+    # @param n node to be removed.
+    # @return parent of the node actually unlinked, or NIL if it was the root.
+    #
+    def unlinkNode(self, n):
+        # first deal with the two-child case copy
+        # data from successor up to n, and then delete successor
+        # node instead of given node n
+        if self.__left[n] != NIL and self.__right[n] != NIL:
+            s = self.successor(n)
+            self.__keys[n] = self.__keys[s]
+            n = s
+
+        # n has at most one child, which may be NIL
+        replacement = self.__left[n]
+        if replacement == NIL:
+            replacement = self.__right[n]
+
+        # link replacement on tree in place of node n
+        parent = self.__parent[n]
+        if parent == NIL:
+            self.__root = replacement
+        elif n == self.__left[parent]:
+            self.__left[parent] = replacement
+        else:
+            self.__right[parent] = replacement
+
+        if replacement != NIL:
+            self.__parent[replacement] = parent
+
+        self.__free_node(n)
+        self.__size -= 1
+        self.update_counters(parent, -1)
+        return parent
+
+    ## Returns an iterator for this tree.
+    def iterator(self):
+        return self.BSTIterator(self)
+
+    ## Returns the number of elements in this tree.
+    def __len__(self):
+        return self.__size
+
+    ## Indexing operator [].
+    # The position is found by descending the subtree counters, in O(log n).
+    # Negative indices count from the largest element.
+    #
+    # @throw IndexError.
+    # @param ind index to retrieve.
+    # @return ind-ith value in the tree, or an exception.
+    #
+    def __getitem__(self, ind):
+        if ind < 0:
+            ind += self.__size
+        if ind < 0 or ind >= self.__size:
+            raise IndexError
+
+        return self.__keys[self.select(ind)]
+
+    ##
+    # Returns the node holding the ind-th smallest element of this tree.
+    #
+    # @param ind index, between 0 and len - 1.
+    # @return the node at position ind, or NIL if ind is out of range.
+    #
+    def select(self, ind):
+        current = self.__root
+        while current != NIL:
+            left = self.counter(self.__left[current])
+            if ind < left:
+                current = self.__left[current]
+            elif ind > left:
+                ind -= left + 1
+                current = self.__right[current]
+            else:
+                return current
+        return NIL
+
+    ## Iterator as a generator, over the keys in ascending order.
+    def __iter__(self):
+        for key in self.iterator():
+            yield key
+
+    ## Returns the keys of this tree, in ascending order, as a list.
+    def toArray(self):
+        return [self.__keys[n] for n in self.__inOrder(self.__root)]
+
+    ## Return the height of this tree.
+    # The height of a tree is the height of its root node.
+    #
+    def height(self):
+        return self.getHeight(self.__root)
+
+    ## Return the height of a subtree.
+    # The height of a node is the number of edges on the longest path between that node and a leaf.
+    # The height of a leaf is 0.
+    # The subtree is visited level by level, so deep trees do not recurse.
+    #
+    # @param root node of the subtree.
+    #
+    def getHeight(self, root):
+        height = -1
+        level = [root] if root != NIL else []
+        while level:
+            height += 1
+            level = [c for n in level for c in (self.__left[n], self.__right[n]) if c != NIL]
+        return height
+
+    ##
+    # Returns a representation of this tree as a multi-line string.
+    # The tree is drawn with the root at the left and children are
+    # shown top-to-bottom.  Leaves are marked with a "-" and non-leaves
+    # are marked with a "+".
+    #
+    def __repr__(self):
+        sb = []
+        self.__toStringRec(self.__root, sb, 0)
+        return ''.join(sb)
+
+    ## Prints the nodes of this tree in order.
+    def __str__(self):
+        st = ""
+        for n in self:
+            st += str(n) + " "
+        return st
+
+    ##
+    # Preorder traversal of the tree that builds a string representation
+    # in the given StringBuilder.
+    #
+    # @param n root of subtree to be traversed.
+    # @param sb list in which to create a string representation.
+    # @param depth depth of the given node in the tree.
+    #
+    def __toStringRec(self, n, sb, depth):
+        sb.append("  " * depth)
+
+        if n == NIL:
+            sb.append("-\n")
+            return
+
+        is_leaf = self.__left[n] == NIL and self.__right[n] == NIL
+        sb.append("- " if is_leaf else "+ ")
+        sb.append(str(self.__keys[n]))
+        sb.append("\n")
+        if not is_leaf:
+            self.__toStringRec(self.__left[n], sb, depth + 1)
+            self.__toStringRec(self.__right[n], sb, depth + 1)
+
+    ##
+    # Execute the rebalancing operation of the subtree starting from a given node.
+    #
+    # @param node root node of the subtree
+    def rebalance(self, node):
+        # empty tree
+        if node == NIL:
+            return
+        node_parent = self.__parent[node]
+
+        subtree_root = self.build_tree(self.__inOrder(node), node_parent)
+
+        # node was tree root
+        if node_parent == NIL:
+            self.__root = subtree_root
+            self.__max_size = self.__size
+
+        # node was left node
+        elif self.__left[node_parent] == node:
+            self.__left[node_parent] = subtree_root
+
+        # node was right node
+        else:
+            self.__right[node_parent] = subtree_root
+
+    ##
+    # Reorganize an ordered array of nodes into a perfectly balanced subtree,
+    # returning its root node.
+    # The links of the balanced layout are computed as in-order positions by
+    # balanced_layout, and mapped to node indices through nodes, which is the
+    # in-order permutation of the slots.
+    #
+    # @param nodes array of node indices, in order
+    # @param parent node that will serve as root parent
+    # @return subtree root node, or NIL if the array is empty
+    #
+    def build_tree(self, nodes, parent):
+        m = len(nodes)
+        if m == 0:
+            return NIL
+
+        left, right, up, counter = balanced_layout(m)
+        if np is not None:
+            # a trailing NIL maps the NIL positions to NIL
+            order = np.append(np.frombuffer(nodes, dtype=np.int64), NIL)
+            # views on the buffers, released before they can be resized
+            for buf, pos in ((self.__left, left), (self.__right, right),
+                             (self.__parent, up)):
+                np.frombuffer(buf, dtype=np.int64)[order[:-1]] = order[pos]
+            np.frombuffer(self.__counter, dtype=np.int64)[order[:-1]] = counter
+        else:
+            for k in range(m):
+                n = nodes[k]
+                self.__left[n] = nodes[left[k]] if left[k] != NIL else NIL
+                self.__right[n] = nodes[right[k]] if right[k] != NIL else NIL
+                self.__parent[n] = nodes[up[k]] if up[k] != NIL else NIL
+                self.__counter[n] = counter[k]
+
+        root = nodes[m // 2]
+        self.__parent[root] = parent
+        return root
+
+    ##
+    # Recursively go upward in the tree from a given node until it finds a
+    # node that is the root of an unbalanced subtree and returns it,
+    # if not even the tree root is unbalanced, returns NIL.
+    #
+    # @param n starting node
+    # @return unbalanced node or NIL
+    #
+    def find_unbalanced(self, n):
+        while self.is_balanced(n):
+            if n == self.__root:
+                return NIL
+            n = self.__parent[n]
+        return n
+
+    ##
+    # Checks whether a node inserted at a given depth violates the scapegoat
+    # depth bound log_{1/alpha}(size), with alpha = top/bottom.
+    #
+    # @param depth number of edges between the node and the root.
+    # @return True if depth is greater than the bound, and False otherwise.
+    #
+    def is_too_deep(self, depth):
+        if self.top >= self.bottom:
+            return False
+        if self.top == 0:
+            # alpha = 0 allows no depth at all
+            return depth > 0
+        return depth > math.log(self.__size, float(self.bottom) / self.top)
+
+    ##
+    # Checks the scapegoat deletion rule: whether the tree has shrunk below
+    # alpha times the largest size it had since it was last rebuilt whole.
+    #
+    # @return True if the whole tree should be rebuilt, and False otherwise.
+    #
+    def is_too_small(self):
+        return self.__size * self.bottom < self.__max_size * self.top
+
+    ##
+    # Checks if a subtree whose root is a given node is balanced.
+    #
+    # @param node root node of subtree
+    # @return returns True if the subtree if balanced and False otherwise.
+    #
+    def is_balanced(self, node):
+        # empty subtree
+        if node == NIL:
+            return True
+        size = self.__counter[node]
+        l = self.counter(self.__left[node])
+        r = self.counter(self.__right[node])
+
+        # balancing equations
+        return l * self.bottom <= size * self.top and \
+               r * self.bottom <= size * self.top
+
+    ##
+    # Adds delta to the counters of a given node and of all its ancestors.
+    #
+    # @param n deepest node whose subtree size changed.
+    # @param delta number of nodes added (positive) or removed (negative).
+    #
+    def update_counters(self, n, delta):
+        counter = self.__counter
+        parent = self.__parent
+        while n != NIL:
+            counter[n] += delta
+            n = parent[n]
+
+    ##
+    # Iterator implementation for this binary search tree. The elements
+    # are returned in ascending order according to their natural ordering.
+    #
+    class BSTIterator(object):
+
+        ##
+        # Constructs an iterator starting at the smallest element in the tree.
+        #
+        def __init__(self, tree):
+            ## Node returned by last call to next() and available
+            #  for removal. This field is NIL when no node is
+            #  available to be removed.
+            self.__pending = NIL
+
+            ## The tree to be traversed.
+            self.__tree = tree
+
+            ## Node to be returned by next call to next().
+            self.__current = self.getSmallestValue(tree.root())
+
+        ## return the smallest node of the subtree starting in n.
+        def getSmallestValue(self, n):
+            if n != NIL:
+                while self.__tree.left(n) != NIL:
+                    n = self.__tree.left(n)
+            return n
+
+        ## Forward iterator.
+        def __iter__(self):
+            return self
+
+        ##
+        # Whether current is not NIL.
+        #
+        def hasNext(self):
+            return self.__current != NIL
+
+        ## Return the content of the current node without advancing.
+        def peek(self):
+            if self.__current == NIL:
+                return None
+            return self.__tree.data(self.__current)
+
+        ##
+        # Returns the key of current node, which is saved in pending.
+        # Current is set to successor(current).
+        #
+        def __next__(self):
+            if not self.hasNext(): raise StopIteration
+            self.__pending = self.__current
+            self.__current = self.__tree.successor(self.__current)
+            return self.__tree.data(self.__pending)
+
+        ## For python 2.
+        def next(self):
+            return self.__next__()
+
+        ##
+        # Removes the node returned by the last call to next().
+        # If pending has two children, unlinkNode(pending) copies the
+        # successor's key into pending and frees the successor's slot,
+        # so current must point to the pending node.
+        #
+        def remove(self):
+            if self.__pending == NIL: raise IndexError
+            tree = self.__tree
+            if tree.left(self.__pending) != NIL and tree.right(self.__pending) != NIL:
+                self.__current = self.__pending
+
+            # counters are updated by unlinkNode
+            tree.unlinkNode(self.__pending)
+            self.__pending = NIL
+
+            # scapegoat deletion rule, see CompactBSTSet.remove
+            if tree.self_balancing and tree.is_too_small():
+                tree.rebalance(tree.root())
+
+##
+# Computes the links of a perfectly balanced tree over m nodes in order,
+# as in-order positions, the midpoint of each range being the root of its
+# subtree. The ranges are split one level at a time, all ranges of a level
+# at once with NumPy when available.
+#
+# @param m number of nodes.
+# @return left, right and parent positions (NIL for none) and subtree sizes,
+#         indexed by position.
+#
+def balanced_layout(m):
+    if np is not None:
+        left = np.full(m, NIL, dtype=np.int64)
+        right = np.full(m, NIL, dtype=np.int64)
+        up = np.full(m, NIL, dtype=np.int64)
+        counter = np.zeros(m, dtype=np.int64)
+        start = np.zeros(1, dtype=np.int64)
+        end = np.full(1, m - 1, dtype=np.int64)
+        parent = np.full(1, NIL, dtype=np.int64)
+        while start.size:
+            mid = (start + end + 1) // 2
+            up[mid] = parent
+            counter[mid] = end - start + 1
+
+            has_left = start < mid
+            has_right = mid < end
+            left[mid[has_left]] = (start[has_left] + mid[has_left]) // 2
+            right[mid[has_right]] = (mid[has_right] + end[has_right] + 2) // 2
+
+            start = np.concatenate((start[has_left], mid[has_right] + 1))
+            end = np.concatenate((mid[has_left] - 1, end[has_right]))
+            parent = np.concatenate((mid[has_left], mid[has_right]))
+        return left, right, up, counter
+
+    left = [NIL] * m
+    right = [NIL] * m
+    up = [NIL] * m
+    counter = [0] * m
+    level = [(0, m - 1, NIL)]
+    while level:
+        children = []
+        for start, end, parent in level:
+            mid = (start + end + 1) // 2
+            up[mid] = parent
+            counter[mid] = end - start + 1
+            if start < mid:
+                left[mid] = (start + mid) // 2
+                children.append((start, mid - 1, mid))
+            if mid < end:
+                right[mid] = (mid + end + 2) // 2
+                children.append((mid + 1, end, mid))
+        level = children
+    return left, right, up, counter
+
+##
+#  Main function for testing.
+#
+#  args not used.
+#
+def main(args=None):
+    if args is None:
+        args = sys.argv
+
+    arr = generateRandomArray(20, 50)
+    bst = CompactBSTSet(True)
+    for i in arr:
+        bst.add(i)
+
+    print("Original tree: height = %d\n%r" % (bst.height(), bst))
+    print("Keys in ascending order:")
+    print(bst)
+
+    for i in arr[::2]:
+        bst.remove(i)
+    bst.rebalance(bst.root())
+    print("\nAfter removing every other key: height = %d\n%r" % (bst.height(), bst))
+
+
+if __name__ == "__main__":
+    main()
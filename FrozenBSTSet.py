@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+# coding: UTF-8
+# vim: tabstop=4:softtabstop=4:shiftwidth=4
+#
+## @package FrozenBSTSet
+#
+#  Immutable search tree stored in a NumPy array, in breadth-first order.
+#
+
+from __future__ import print_function
+
+import sys
+import numpy as np
+from BSTSet import generateRandomArray
+
+##
+# Immutable set of keys laid out as an implicit complete binary search tree
+# in a NumPy array, in breadth-first (Eytzinger) order: the children of the
+# node at slot k are at slots 2k and 2k+1, slot 0 being unused.
+#  - A search reads the slots of a root-to-leaf path, which are close to
+#    each other near the root, and chooses the child by arithmetic on the
+#    comparison instead of branching: k = 2k + (key > keys[k]).
+#  - The slot of the lower bound of a key is recovered from the final slot
+#    of the descent by dropping its trailing one bits and the zero above them.
+#  - The in-order position of each slot, and the slot of each position,
+#    are kept to answer rank and index queries.
+#  - contains_many() descends for a whole batch of probes at once,
+#    one level per NumPy operation.
+#
+#   Instances are usually made by BSTSet.freeze().
+#
+#   To run:
+#      - python FrozenBSTSet.py
+#
+#   @see <a href="https://arxiv.org/abs/1509.05053">Array layouts for comparison-based searching</a>
+#
+class FrozenBSTSet(object):
+
+    ##
+    # Builds the set from an iterable of keys, in any order.
+    # Repeated keys are stored only once.
+    #
+    # @param iterable keys of the set, of a type NumPy compares vectorized.
+    # @throw ValueError if the keys are not scalars, tuples for instance,
+    #        which NumPy would take as the rows of a matrix.
+    #
+    def __init__(self, iterable=()):
+        keys = np.asarray(list(iterable))
+        if keys.ndim != 1:
+            raise ValueError("keys must be scalars, got an array of shape %s" % (keys.shape,))
+        keys = np.unique(keys)
+        n = len(keys)
+
+        ## Number of elements in this set.
+        self.__size = n
+
+        ## In-order position of the key at each slot, -1 at slot 0.
+        self.__pos = eytzinger_positions(n)
+
+        ## Slot of the key at each in-order position.
+        self.__slot = np.empty(n, dtype=np.int64)
+        self.__slot[self.__pos[1:]] = np.arange(1, n + 1)
+
+        ## Keys in breadth-first order, slot 0 holding a copy of the root.
+        self.__keys = np.empty(n + 1, dtype=keys.dtype)
+        self.__keys[1:] = keys[self.__pos[1:]]
+        if n:
+            self.__keys[0] = self.__keys[1]
+
+    ## Returns the number of elements in this set.
+    def __len__(self):
+        return self.__size
+
+    ## Return whether this set is empty.
+    def isEmpty(self):
+        return self.__size == 0
+
+    ## Return the height of the implicit tree, -1 if it is empty.
+    def height(self):
+        return self.__size.bit_length() - 1
+
+    ##
+    # Descends from the root to a leaf, going right past the keys smaller
+    # than key, or not greater than key if right is set.
+    #
+    # @param key given object.
+    # @param right whether keys equal to key are passed to the right.
+    # @return slot of the first key greater than (or equal to) key, or 0.
+    #
+    def __descend(self, key, right):
+        # item() returns Python scalars, which compare much faster
+        item = self.__keys.item
+        n = self.__size
+        k = 1
+        if right:
+            while k <= n:
+                k = 2 * k + (item(k) <= key)
+        else:
+            while k <= n:
+                k = 2 * k + (item(k) < key)
+        return lower_bound_slot(k)
+
+    ##
+    # Returns whether the given object is in this set.
+    #
+    # @param obj given object.
+    # @return True if the object is in the set, or False otherwise.
+    #
+    def __contains__(self, obj):
+        k = self.__descend(obj, False)
+        return k != 0 and self.__keys.item(k) == obj
+
+    ##
+    # Returns whether each of a batch of keys is in this set.
+    # All probes descend together, one level of the tree per step.
+    #
+    # @param keys array-like of probes, in any order.
+    # @return boolean array, in the order of the probes.
+    #
+    def contains_many(self, keys):
+        probes = np.asarray(keys)
+        if self.__size == 0 or probes.size == 0:
+            return np.zeros(probes.shape, dtype=bool)
+
+        k = self.__descend_many(probes.ravel())
+        found = (k != 0) & (self.__keys[k] == probes.ravel())
+        return found.reshape(probes.shape)
+
+    ##
+    # Vectorized __descend, for the lower bounds of a flat array of probes.
+    # Every probe takes height() steps, and the probes still inside the
+    # tree take one more, since only the last level may be incomplete.
+    #
+    # @param probes one-dimensional array of keys.
+    # @return array of lower bound slots, 0 where there is none.
+    #
+    def __descend_many(self, probes):
+        keys = self.__keys
+        k = np.ones(len(probes), dtype=np.int64)
+        for level in range(self.height()):
+            k = 2 * k + (keys[k] < probes)
+
+        inside = k <= self.__size
+        k[inside] = 2 * k[inside] + (keys[k[inside]] < probes[inside])
+        return lower_bound_slot(k)
+
+    ##
+    # Returns the number of elements of this set that are smaller than key.
+    #
+    # @param key given object, not necessarily in the set.
+    # @return rank of key.
+    #
+    def rank(self, key):
+        return self.bisect_left(key)
+
+    ##
+    # Returns the index where key would be inserted to keep the elements sorted,
+    # before any element equal to key, like bisect.bisect_left.
+    #
+    # @param key given object, not necessarily in the set.
+    # @return number of elements smaller than key.
+    #
+    def bisect_left(self, key):
+        k = self.__descend(key, False)
+        return int(self.__pos[k]) if k != 0 else self.__size
+
+    ##
+    # Returns the index where key would be inserted to keep the elements sorted,
+    # after any element equal to key, like bisect.bisect_right.
+    #
+    # @param key given object, not necessarily in the set.
+    # @return number of elements smaller than or equal to key.
+    #
+    def bisect_right(self, key):
+        k = self.__descend(key, True)
+        return int(self.__pos[k]) if k != 0 else self.__size
+
+    ##
+    # Returns the positions delimiting the keys between lo and hi.
+    #
+    # @param lo lower bound, or None for no lower bound.
+    # @param hi upper bound, or None for no upper bound.
+    # @param inclusive pair telling whether lo and hi belong to the range.
+    # @return start and end positions.
+    #
+    def __range(self, lo, hi, inclusive):
+        start = 0
+        if lo is not None:
+            start = self.bisect_left(lo) if inclusive[0] else self.bisect_right(lo)
+
+        end = self.__size
+        if hi is not None:
+            end = self.bisect_right(hi) if inclusive[1] else self.bisect_left(hi)
+
+        return start, max(start, end)
+
+    ##
+    # Returns the number of keys between lo and hi.
+    #
+    # @param lo lower bound, or None for no lower bound.
+    # @param hi upper bound, or None for no upper bound.
+    # @param inclusive pair telling whether lo and hi belong to the range.
+    # @return number of keys in the range.
+    #
+    def count_range(self, lo=None, hi=None, inclusive=(True, True)):
+        start, end = self.__range(lo, hi, inclusive)
+        return end - start
+
+    ##
+    # Returns the keys between lo and hi.
+    #
+    # @param lo lower bound, or None for no lower bound.
+    # @param hi upper bound, or None for no upper bound.
+    # @param inclusive pair telling whether lo and hi belong to the range.
+    # @param reverse whether the keys are returned in descending order.
+    # @return array of the keys in the range.
+    #
+    def irange(self, lo=None, hi=None, inclusive=(True, True), reverse=False):
+        start, end = self.__range(lo, hi, inclusive)
+        slots = self.__slot[start:end]
+        return self.__keys[slots[::-1] if reverse else slots]
+
+    ## Indexing operator [].
+    # Negative indices count from the largest element, and a slice
+    # returns a list with the selected elements. Keys are returned as
+    # Python objects, as the trees return them.
+    #
+    # @throw IndexError.
+    # @param ind index or slice to retrieve.
+    # @return ind-ith value in the set, or an exception.
+    #
+    def __getitem__(self, ind):
+        if isinstance(ind, slice):
+            return self.__keys[self.__slot[ind]].tolist()
+
+        if ind < 0:
+            ind += self.__size
+        if ind < 0 or ind >= self.__size:
+            raise IndexError
+
+        return self.__keys.item(self.__slot[ind])
+
+    ## Iterator over the keys in ascending order, as Python objects.
+    def __iter__(self):
+        return iter(self.toArray())
+
+    ## Returns the keys in ascending order, as a new NumPy array.
+    def to_numpy(self):
+        return self.__keys[self.__slot]
+
+    ## Returns the keys in ascending order, as a list.
+    def toArray(self):
+        return self.to_numpy().tolist()
+
+    ## Prints the keys of this set in order.
+    def __str__(self):
+        return " ".join(str(key) for key in self.toArray())
+
+    ## Return a string representation of this set.
+    def __repr__(self):
+        return "FrozenBSTSet([%s])" % ", ".join(repr(key) for key in self.toArray())
+
+##
+# Returns the slot of the lower bound found by a descent that stopped at
+# slot k, below the leaves: the last node where the descent went left,
+# whose slot is k without its trailing one bits and the zero above them.
+# Works on a slot or an array of slots.
+#
+# @param k slot or array of slots past the last level.
+# @return slot of the lower bound, 0 if the descent never went left.
+#
+def lower_bound_slot(k):
+    return k // ((k ^ (k + 1)) + 1)
+
+##
+# Computes the in-order position of each slot of a complete binary tree
+# with n nodes in breadth-first order, one level at a time. The subtree
+# sizes are accumulated from the last level up, and the positions are
+# derived from the root down: a left child precedes its parent by one plus
+# the size of its own right subtree, and a right child follows its parent
+# by one plus the size of its own left subtree.
+#
+# @param n number of nodes.
+# @return int64 array of n + 1 positions, -1 at the unused slot 0.
+#
+def eytzinger_positions(n):
+    pos = np.full(n + 1, -1, dtype=np.int64)
+    if n == 0:
+        return pos
+
+    # sizes of the subtrees, zero past the last slot
+    size = np.zeros(4 * n + 4, dtype=np.int64)
+    levels = [np.arange(1 << d, min(2 << d, n + 1)) for d in range(n.bit_length())]
+    for k in reversed(levels):
+        size[k] = 1 + size[2 * k] + size[2 * k + 1]
+
+    pos[1] = size[2]
+    for k in levels[:-1]:
+        left = 2 * k[2 * k <= n]
+        pos[left] = pos[left // 2] - 1 - size[2 * left + 1]
+        right = 2 * k[2 * k + 1 <= n] + 1
+        pos[right] = pos[right // 2] + 1 + size[2 * right]
+    return pos
+
+##
+#  Main function for testing.
+#
+#  args not used.
+#
+def main(args=None):
+    if args is None:
+        args = sys.argv
+
+    arr = generateRandomArray(20, 50)
+    frozen = FrozenBSTSet(arr)
+    print("Keys in ascending order: %s" % frozen)
+    print("height = %d, len = %d" % (frozen.height(), len(frozen)))
+    print("contains_many(0..9) = %s" % frozen.contains_many(range(10)))
+    print("keys in [10, 20]: %s" % frozen.irange(10, 20))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# coding: UTF-8
+# vim: tabstop=4:softtabstop=4:shiftwidth=4
+#
+## @package benchmark
+#
+#  Performance measurements for the search trees.
+#
+#   To run:
+#      - python benchmark.py [insert|setops|memory|lookup|compare] [max number of keys]
+#
+
+from __future__ import print_function
+
+import sys
+import time
+import tracemalloc
+from random import randrange, sample, shuffle
+import BalancedBSTSet as bbst
+from BSTSet import cmp
+from BalancedBSTSet import BalancedBSTSet
+from CompactBSTSet import CompactBSTSet
+
+## Tree sizes used by default.
+SIZES = (10000, 100000, 1000000)
+
+##
+#  Returns a list with n distinct keys in random order.
+#
+#  @param n number of keys.
+#  @return shuffled list of keys.
+#
+def randomKeys(n):
+    keys = list(range(n))
+    shuffle(keys)
+    return keys
+
+##
+#  Measures the insert throughput of a self-balancing tree.
+#  The incremental counters are compared against recounting the whole
+#  tree after each insertion (the former behaviour), which is measured
+#  on a small sample of insertions into a tree that already holds n keys.
+#
+#  @param sizes list of tree sizes.
+#  @param sample number of insertions timed with full recounts.
+#
+def benchInsert(sizes=SIZES, sample=20):
+    print("%10s %18s %18s" % ("keys", "incremental (op/s)", "recount (op/s)"))
+    for n in sizes:
+        keys = randomKeys(n + sample)
+        tree = BalancedBSTSet(True)
+
+        start = time.perf_counter()
+        for k in keys[:n]:
+            tree.add(k)
+        incremental = n / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for k in keys[n:]:
+            tree.add(k)
+            tree.count_node(tree.root())
+        recount = sample / (time.perf_counter() - start)
+
+        print("%10d %18.0f %18.0f" % (n, incremental, recount))
+
+##
+#  Times a function call.
+#
+#  @return elapsed time in seconds.
+#
+def elapsed(f, *args):
+    start = time.perf_counter()
+    f(*args)
+    return time.perf_counter() - start
+
+##
+#  Compares the vectorized set operations against the pure Python merges,
+#  for two trees (results built as trees, by the merges or through arrays
+#  exported by to_numpy) and for two NumPy arrays against two lists, each
+#  operand holding n random integer keys out of 2n.
+#
+#  @param sizes list of operand sizes.
+#
+def benchSetOps(sizes=SIZES):
+    if bbst.np is None:
+        print("NumPy is not available.")
+        return
+
+    ops = (("union", bbst.set_union),
+           ("intersection", bbst.set_intersection),
+           ("diff", bbst.set_diff))
+    print("%10s %13s %12s %12s %12s %12s" %
+          ("keys", "operation", "tree numpy", "tree python", "array", "list"))
+    for n in sizes:
+        keys1 = sorted(sample(range(2 * n), n))
+        keys2 = sorted(sample(range(2 * n), n))
+        t1 = BalancedBSTSet.from_sorted(keys1)
+        t2 = BalancedBSTSet.from_sorted(keys2)
+        a1 = bbst.np.array(keys1)
+        a2 = bbst.np.array(keys2)
+        for name, op in ops:
+            print("%10d %13s %11.3fs %11.3fs %11.3fs %11.3fs" %
+                  (n, name,
+                   elapsed(lambda: BalancedBSTSet.from_sorted(
+                       op(t1.to_numpy(), t2.to_numpy()).tolist())),
+                   elapsed(op, t1, t2),
+                   elapsed(op, a1, a2),
+                   elapsed(op, keys1, keys2)))
+
+##
+#  Measures the memory held by the nodes of a tree, in bytes per key, with
+#  tracemalloc. The slotted nodes are compared against subclasses without
+#  __slots__, which carry a per-instance __dict__ as the nodes used to,
+#  and against the parallel buffers of CompactBSTSet.
+#
+#  @param sizes list of tree sizes.
+#
+def benchMemory(sizes=SIZES):
+    class DictNode(BalancedBSTSet.Node):
+        pass
+
+    class DictTree(BalancedBSTSet):
+        Node = DictNode
+
+    print("%10s %18s %18s %18s" %
+          ("keys", "slots (B/key)", "__dict__ (B/key)", "compact (B/key)"))
+    for n in sizes:
+        keys = list(range(n))
+        usage = []
+        for cls in (BalancedBSTSet, DictTree, CompactBSTSet):
+            tracemalloc.start()
+            tree = cls.from_sorted(keys)
+            usage.append(tracemalloc.get_traced_memory()[0] / n)
+            tracemalloc.stop()
+            del tree
+        print("%10d %18.1f %18.1f %18.1f" % (n, usage[0], usage[1], usage[2]))
+
+##
+#  Compares batch membership tests against one "in" per key, for batches
+#  of random probes, half of them in the tree, against a tree with n keys.
+#  Small batches are answered key by key, and batches of n/2 probes by an
+#  in-order walk. The frozen copy made by freeze() is also measured when
+#  NumPy is available.
+#
+#  @param sizes list of tree sizes.
+#  @param probes total number of probes per measurement.
+#
+def benchLookup(sizes=SIZES, probes=100000):
+    print("%10s %10s %15s %15s %15s" %
+          ("keys", "batch", "loop (us/key)", "many (us/key)", "frozen (us/key)"))
+    for n in sizes:
+        tree = BalancedBSTSet.from_sorted(range(0, 2 * n, 2))
+        frozen = tree.freeze() if bbst.np is not None else None
+        for batch in (500, n // 2):
+            batches = [sample(range(2 * n), batch) for i in range(max(1, probes // batch))]
+            total = batch * len(batches) / 1e6
+
+            loop = elapsed(lambda: [[k in tree for k in b] for b in batches])
+            many = elapsed(lambda: [tree.contains_many(b) for b in batches])
+            fast = float("nan")
+            if frozen is not None:
+                fast = elapsed(lambda: [frozen.contains_many(b) for b in batches])
+
+            print("%10d %10d %15.2f %15.2f %15.2f" %
+                  (n, batch, loop / total, many / total, fast / total))
+
+##
+#  Key wrapper counting the comparisons made between keys.
+#
+class CountedKey(object):
+    __slots__ = ('key',)
+
+    ## Number of comparisons made so far.
+    count = 0
+
+    ## Wraps a key.
+    def __init__(self, key):
+        ## Wrapped key.
+        self.key = key
+
+    ## Counted "<".
+    def __lt__(self, other):
+        CountedKey.count += 1
+        return self.key < other.key
+
+    ## Counted ">".
+    def __gt__(self, other):
+        CountedKey.count += 1
+        return self.key > other.key
+
+    ## Counted "==".
+    def __eq__(self, other):
+        CountedKey.count += 1
+        return self.key == other.key
+
+##
+#  Compares the direct key comparisons of the descents against the
+#  compareTo hook, which is used when a Node subclass overrides it, for
+#  findEntry on int and str keys, half of the probes being in the tree.
+#  The time per lookup is measured with plain keys, and the number of
+#  comparisons per lookup with the keys wrapped in CountedKey.
+#
+#  @param sizes list of tree sizes.
+#  @param lookups number of lookups per measurement.
+#
+def benchCompare(sizes=SIZES, lookups=100000):
+    class HookNode(BalancedBSTSet.Node):
+        __slots__ = ()
+
+        def compareTo(self, key):
+            return cmp(self.data, key)
+
+    class HookTree(BalancedBSTSet):
+        Node = HookNode
+
+    print("%10s %5s %13s %15s %13s %15s" % ("keys", "type", "direct (ns)",
+          "compareTo (ns)", "direct (cmp)", "compareTo (cmp)"))
+    for n in sizes:
+        for name, kind in (("int", int), ("str", lambda k: "%010d" % k)):
+            keys = [kind(k) for k in range(0, 2 * n, 2)]
+            probes = [kind(randrange(2 * n)) for i in range(lookups)]
+            row = []
+            for cls in (BalancedBSTSet, HookTree):
+                tree = cls.from_sorted(keys)
+                row.append(elapsed(lambda: [tree.findEntry(k) for k in probes]) * 1e9 / lookups)
+            for cls in (BalancedBSTSet, HookTree):
+                tree = cls.from_sorted(CountedKey(k) for k in keys)
+                counted = [CountedKey(k) for k in probes[:1000]]
+                CountedKey.count = 0
+                for k in counted:
+                    tree.findEntry(k)
+                row.append(CountedKey.count / float(len(counted)))
+            print("%10d %5s %13.0f %15.0f %13.1f %15.1f" % ((n, name) + tuple(row)))
+
+##
+#  Main function.
+#
+#  @param args command line arguments: benchmark name and maximum tree size.
+#
+def main(args=None):
+    if args is None:
+        args = sys.argv
+
+    name = args[1] if len(args) > 1 else "insert"
+    limit = int(args[2]) if len(args) > 2 else SIZES[-1]
+    sizes = [n for n in SIZES if n <= limit]
+
+    if name == "insert":
+        benchInsert(sizes)
+    elif name == "setops":
+        benchSetOps(sizes)
+    elif name == "memory":
+        benchMemory(sizes)
+    elif name == "lookup":
+        benchLookup(sizes)
+    elif name == "compare":
+        benchCompare(sizes)
+    else:
+        print("Unknown benchmark: %s" % name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,567 @@
+#!/usr/bin/env python
+# coding: UTF-8
+# vim: tabstop=4:softtabstop=4:shiftwidth=4
+#
+## @package test_BalancedBSTSet
+#
+#  Randomized checks of BalancedBSTSet against the built-in set.
+#
+#   To run:
+#      - python -m unittest test_BalancedBSTSet
+#      - python -m pytest test_BalancedBSTSet.py
+#
+
+import math
+import random
+import unittest
+from bisect import bisect_left, bisect_right
+import BalancedBSTSet as bbst
+from BalancedBSTSet import BalancedBSTSet
+from BSTSet import BSTSet
+import CompactBSTSet as cbst
+from CompactBSTSet import CompactBSTSet, NIL
+
+try:
+    import FrozenBSTSet as fbst
+except ImportError:
+    fbst = None
+
+##
+#  Checks the order, parent links and subtree counters of a tree,
+#  and that it holds exactly the keys of a set.
+#
+#  @param test test case reporting the failures.
+#  @param tree tree to be checked.
+#  @param keys expected keys.
+#
+def assertTree(test, tree, keys):
+    test.assertEqual(list(tree), sorted(keys))
+    test.assertEqual(len(tree), len(keys))
+
+    root = tree.root()
+    if root is not None:
+        test.assertIsNone(root.parent)
+    stack = [root] if root is not None else []
+    while stack:
+        n = stack.pop()
+        count = 1
+        for child in (n.left, n.right):
+            if child is not None:
+                test.assertIs(child.parent, n)
+                count += child.counter
+                stack.append(child)
+        test.assertEqual(n.counter, count)
+
+##
+#  Returns a random tree, and the set of its keys: a tree built by
+#  from_sorted, or a self-balancing or plain tree shaped by insertions
+#  and removals.
+#
+#  @param rnd random number generator.
+#
+def randomTree(rnd):
+    keys = set(rnd.sample(range(200), rnd.randint(0, 120)))
+    shape = rnd.randrange(3)
+    if shape == 0:
+        return BalancedBSTSet.from_sorted(sorted(keys), True), keys
+
+    tree = BalancedBSTSet(shape == 1)
+    order = list(keys)
+    rnd.shuffle(order)
+    for k in order:
+        tree.add(k)
+    for k in rnd.sample(order, len(order) // 4):
+        tree.remove(k)
+        keys.discard(k)
+    return tree, keys
+
+##
+#  Split, join and the in-place set updates of BalancedBSTSet, on trees
+#  shaped by insertions and removals (self-balancing or not), as well as
+#  on trees built by from_sorted.
+#
+class TestSplitJoin(unittest.TestCase):
+
+    ## Number of random trials of each test.
+    TRIALS = 1000
+
+    def setUp(self):
+        self.rnd = random.Random(2019)
+
+    ## The reported failure: split of a small scapegoat-shaped tree.
+    def test_split_small(self):
+        tree = BalancedBSTSet(True)
+        for k in (1, 2, 3, 0, 6, 5, 4, 7):
+            tree.add(k)
+        lt, found, gt = tree.split(1)
+        self.assertEqual(found, 1)
+        assertTree(self, lt, {0})
+        assertTree(self, gt, {2, 3, 4, 5, 6, 7})
+
+    def test_split_join(self):
+        for i in range(self.TRIALS):
+            tree, keys = randomTree(self.rnd)
+            key = self.rnd.randrange(-5, 205)
+            lt, found, gt = tree.split(key)
+            self.assertEqual(found, key if key in keys else None)
+            assertTree(self, tree, set())
+            assertTree(self, lt, {k for k in keys if k < key})
+            assertTree(self, gt, {k for k in keys if k > key})
+
+            joined = BalancedBSTSet.join(lt, key, gt)
+            assertTree(self, joined, keys | {key})
+            assertTree(self, lt, set())
+            assertTree(self, gt, set())
+
+    def test_join_out_of_order(self):
+        lt = BalancedBSTSet.from_sorted([1, 2, 3])
+        gt = BalancedBSTSet.from_sorted([5, 6])
+        with self.assertRaises(ValueError):
+            BalancedBSTSet.join(lt, 3, gt)
+        with self.assertRaises(ValueError):
+            BalancedBSTSet.join(lt, 6, gt)
+
+    ##
+    #  On a scapegoat tree shaped by insertions, which is not weight-balanced,
+    #  split and union_update must not rebuild large subtrees.
+    #
+    def test_rebuilt_nodes(self):
+        class CountingTree(BalancedBSTSet):
+            built = 0
+
+            def build_tree(self, nodes, parent):
+                CountingTree.built += len(nodes)
+                return super().build_tree(nodes, parent)
+
+        n = 20000
+        keys = list(range(0, 4 * n, 4))
+        self.rnd.shuffle(keys)
+        tree = CountingTree(True)
+        for k in keys:
+            tree.add(k)
+
+        CountingTree.built = 0
+        batch = self.rnd.sample(range(4 * n), 100)
+        tree.union_update(batch)
+        self.assertLess(CountingTree.built, 2000)
+        expected = set(keys) | set(batch)
+        assertTree(self, tree, expected)
+
+        CountingTree.built = 0
+        lt, found, gt = tree.split(2 * n + 1)
+        self.assertEqual(CountingTree.built, 0)
+        assertTree(self, lt, {k for k in expected if k < 2 * n + 1})
+        assertTree(self, gt, {k for k in expected if k > 2 * n + 1})
+
+    def test_updates(self):
+        for i in range(self.TRIALS):
+            other = set(self.rnd.sample(range(200), self.rnd.randint(0, 120)))
+            for name, op in (("union_update", set.union),
+                             ("intersection_update", set.intersection),
+                             ("difference_update", set.difference)):
+                tree, keys = randomTree(self.rnd)
+                getattr(tree, name)(other)
+                assertTree(self, tree, op(keys, other))
+
+
+##
+#  remove_many against set difference, with batches small enough to be
+#  unlinked one by one and large enough to filter and rebuild the tree.
+#
+class TestRemoveMany(unittest.TestCase):
+
+    ## Number of random trials of each test.
+    TRIALS = 1000
+
+    def setUp(self):
+        self.rnd = random.Random(2019)
+
+    def test_remove_many(self):
+        for i in range(self.TRIALS):
+            tree, keys = randomTree(self.rnd)
+            size = self.rnd.choice((0, 1, 3, 10, 40, 300))
+            batch = [self.rnd.randrange(-10, 210) for j in range(size)]
+            self.assertEqual(tree.remove_many(batch), len(keys & set(batch)))
+            assertTree(self, tree, keys - set(batch))
+
+    def test_unhashable_keys(self):
+        tree = BalancedBSTSet.from_sorted([[1], [2], [3], [4]], True)
+        self.assertEqual(tree.remove_many([[2], [4], [2], [5]]), 2)
+        self.assertEqual(list(tree), [[1], [3]])
+
+
+##
+#  Trees given a key function, holding records that do not support "<",
+#  in the set operations and comparisons.
+#
+class TestKeyFunction(unittest.TestCase):
+
+    ## Number of random trials of each test.
+    TRIALS = 300
+
+    def setUp(self):
+        self.rnd = random.Random(2019)
+
+    ##
+    #  Returns a tree of records ordered by their "id", and the set of the ids.
+    #
+    def randomTree(self):
+        ids = set(self.rnd.sample(range(60), self.rnd.randint(0, 40)))
+        tree = BalancedBSTSet(self.rnd.random() < 0.5, key=lambda r: r["id"])
+        for i in ids:
+            tree.add({"id": i})
+        return tree, ids
+
+    def test_set_operations(self):
+        for i in range(self.TRIALS):
+            t1, ids1 = self.randomTree()
+            t2, ids2 = self.randomTree()
+            records = [{"id": k} for k in sorted(ids2)]
+            for other in (t2, records):
+                for op, expected in ((bbst.set_union, ids1 | ids2),
+                                     (bbst.set_intersection, ids1 & ids2),
+                                     (bbst.set_diff, ids1 - ids2)):
+                    result = op(t1, other)
+                    self.assertIs(result.key, t1.key)
+                    self.assertEqual([r["id"] for r in result], sorted(expected))
+
+    def test_comparisons(self):
+        for i in range(self.TRIALS):
+            t1, ids1 = self.randomTree()
+            t2, ids2 = self.randomTree()
+            records = [{"id": k} for k in ids2]
+            for other in (t2, records):
+                self.assertEqual(t1.issubset(other), ids1 <= ids2)
+                self.assertEqual(t1.issuperset(other), ids1 >= ids2)
+                self.assertEqual(t1.isdisjoint(other), not ids1 & ids2)
+            self.assertEqual(t1 == t2, ids1 == ids2)
+
+    def test_all(self):
+        for i in range(self.TRIALS // 10):
+            trees = [self.randomTree() for j in range(3)]
+            records = [{"id": k} for k in sorted(trees[2][1])]
+            sets = [trees[0][0], trees[1][0], records]
+            ids = [t[1] for t in trees]
+            for op, expected in ((bbst.union_all, ids[0] | ids[1] | ids[2]),
+                                 (bbst.intersection_all, ids[0] & ids[1] & ids[2])):
+                result = op(*sets)
+                self.assertIs(result.key, trees[0][0].key)
+                self.assertEqual([r["id"] for r in result], sorted(expected))
+
+    def test_split(self):
+        tree, ids = self.randomTree()
+        tree.add({"id": 100, "name": "hundred"})
+        lt, found, gt = tree.split(100)
+        self.assertEqual(found, {"id": 100, "name": "hundred"})
+        joined = BalancedBSTSet.join(lt, found, gt)
+        self.assertEqual([r["id"] for r in joined], sorted(ids | {100}))
+        self.assertEqual(joined[joined.rank(100)], found)
+
+    def test_nodes(self):
+        tree, ids = self.randomTree()
+        tree.add({"id": 100})
+        self.assertEqual(tree.root().key, tree.root().data["id"])
+        # only the nodes of trees with a key function have a key slot
+        plain = BalancedBSTSet.from_sorted([1, 2]).root()
+        self.assertIs(type(plain), BalancedBSTSet.Node)
+        self.assertFalse(hasattr(plain, "__dict__"))
+        self.assertIn("key", type(tree.root()).__slots__)
+        with self.assertRaises(ValueError):
+            tree.freeze()
+
+
+##
+#  Scapegoat rules of self-balancing trees: inserts deeper than the depth
+#  bound rebuild a scapegoat, and removals rebuild the whole tree once it
+#  shrinks below alpha times its largest size.
+#
+class TestScapegoat(unittest.TestCase):
+
+    def test_removals(self):
+        class CountingTree(BalancedBSTSet):
+            built = 0
+
+            def build_tree(self, nodes, parent):
+                CountingTree.built += len(nodes)
+                return super().build_tree(nodes, parent)
+
+        rnd = random.Random(2019)
+        n = 20000
+        keys = rnd.sample(range(10 * n), n)
+        tree = CountingTree(True)
+        for k in keys:
+            tree.add(k)
+
+        # few removals rebuild nothing
+        CountingTree.built = 0
+        removed = rnd.sample(keys, 1000)
+        for k in removed:
+            self.assertTrue(tree.remove(k))
+        self.assertEqual(CountingTree.built, 0)
+        self.assertLessEqual(tree.height(), math.log(n, 1.5) + 1)
+
+        # shrinking below 2/3 of the largest size rebuilds the whole tree once
+        rest = sorted(set(keys) - set(removed))
+        for k in rest[:len(rest) // 2]:
+            tree.remove(k)
+        self.assertLess(CountingTree.built, n)
+        self.assertLessEqual(tree.height(), math.log(len(tree), 1.5) + 1)
+        assertTree(self, tree, set(rest[len(rest) // 2:]))
+
+    def test_zero_alpha(self):
+        tree = BalancedBSTSet(True, 0, 5)
+        for k in range(20):
+            tree.add(k)
+        for k in range(0, 20, 3):
+            tree.remove(k)
+        assertTree(self, tree, {k for k in range(20) if k % 3})
+
+
+##
+#  Results of the set operations on plain BSTSet operands, which are
+#  built at once by BSTSet.from_sorted.
+#
+class TestBSTSetResults(unittest.TestCase):
+
+    def test_set_operations(self):
+        rnd = random.Random(2019)
+        for i in range(100):
+            keys1 = set(rnd.sample(range(300), rnd.randint(0, 200)))
+            keys2 = set(rnd.sample(range(300), rnd.randint(0, 200)))
+            t1, t2 = BSTSet(), BSTSet()
+            for k in keys1:
+                t1.add(k)
+            for k in keys2:
+                t2.add(k)
+            for op, expected in ((bbst.set_union, keys1 | keys2),
+                                 (bbst.set_intersection, keys1 & keys2),
+                                 (bbst.set_diff, keys1 - keys2)):
+                result = op(t1, t2)
+                self.assertIs(type(result), BSTSet)
+                self.assertEqual(list(result), sorted(expected))
+                self.assertEqual(len(result), len(expected))
+                self.assertLessEqual(result.height(), len(expected).bit_length() - 1)
+
+
+##
+#  Lazy intersections of a small operand with a much larger one, which
+#  gallop through trees, lists and tuples.
+#
+class TestSkewedIntersection(unittest.TestCase):
+
+    def test_skewed(self):
+        rnd = random.Random(2019)
+        big = sorted(rnd.sample(range(100000), 20000))
+        tree = BalancedBSTSet.from_sorted(big)
+        for i in range(100):
+            small = sorted(rnd.sample(range(100000), rnd.randint(0, 50)))
+            expected = sorted(set(small) & set(big))
+            for operands in ((small, tree), (tree, small), (tuple(small), big)):
+                self.assertEqual(list(bbst.iintersection(*operands)), expected)
+
+    @unittest.skipIf(bbst.np is None, "NumPy is not available")
+    def test_numpy_operand(self):
+        tree = BalancedBSTSet.from_sorted(range(0, 100000, 2))
+        small = bbst.np.array([2, 3, 4, 99998])
+        self.assertEqual(list(bbst.iintersection(small, tree)), [2, 4, 99998])
+        self.assertEqual(list(bbst.iintersection(tree, small)), [2, 4, 99998])
+
+
+##
+#  Key wrapper defining "<" and ">" but not "==", which then falls back
+#  to identity, so equal keys may only be told apart by their order.
+#
+class Ordered(object):
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return self.value < other.value
+
+    def __gt__(self, other):
+        return self.value > other.value
+
+##
+#  Keys ordered by "<" alone, in the descents of every tree type.
+#
+class TestOrderOnlyKeys(unittest.TestCase):
+
+    def test_descents(self):
+        for tree in (BSTSet(), BalancedBSTSet(), BalancedBSTSet(True), CompactBSTSet()):
+            for v in (5, 3, 8, 5, 3):
+                tree.add(Ordered(v))
+            self.assertEqual(len(tree), 3)
+            self.assertIn(Ordered(8), tree)
+            self.assertNotIn(Ordered(4), tree)
+            self.assertTrue(tree.remove(Ordered(3)))
+            self.assertEqual([k.value for k in tree], [5, 8])
+
+    def test_find_many(self):
+        tree = BalancedBSTSet.from_sorted(Ordered(v) for v in range(0, 200, 2))
+        for probes in (range(3), range(400)):
+            found = tree.contains_many([Ordered(v) for v in probes])
+            self.assertEqual(found, [v % 2 == 0 and v < 200 for v in probes])
+
+
+##
+#  Checks the order, parent links and subtree counters of a CompactBSTSet,
+#  and that it holds exactly the keys of a set.
+#
+#  @param test test case reporting the failures.
+#  @param tree tree to be checked.
+#  @param keys expected keys.
+#  @return list of the slots of the nodes.
+#
+def assertCompact(test, tree, keys):
+    test.assertEqual(list(tree), sorted(keys))
+    test.assertEqual(len(tree), len(keys))
+
+    root = tree.root()
+    if root != NIL:
+        test.assertEqual(tree.parent(root), NIL)
+    slots = []
+    stack = [root] if root != NIL else []
+    while stack:
+        n = stack.pop()
+        slots.append(n)
+        count = 1
+        for child in (tree.left(n), tree.right(n)):
+            if child != NIL:
+                test.assertEqual(tree.parent(child), n)
+                count += tree.counter(child)
+                stack.append(child)
+        test.assertEqual(tree.counter(n), count)
+    return slots
+
+##
+#  CompactBSTSet against set, with and without the NumPy rebuilds.
+#
+class TestCompactBSTSet(unittest.TestCase):
+
+    ## Number of random trials of each test.
+    TRIALS = 300
+
+    def setUp(self):
+        self.rnd = random.Random(2019)
+
+    def test_layout(self):
+        if cbst.np is None:
+            self.skipTest("NumPy is not available")
+        for m in range(1, 200):
+            vectorized = [list(a) for a in cbst.balanced_layout(m)]
+            np, cbst.np = cbst.np, None
+            try:
+                plain = [list(a) for a in cbst.balanced_layout(m)]
+            finally:
+                cbst.np = np
+            self.assertEqual(vectorized, plain)
+
+    def test_updates(self):
+        for i in range(self.TRIALS):
+            rnd = self.rnd
+            keys = set(rnd.sample(range(200), rnd.randint(0, 120)))
+            if rnd.random() < 0.5:
+                tree = CompactBSTSet.from_sorted(sorted(keys), rnd.random() < 0.5)
+            else:
+                tree = CompactBSTSet(rnd.random() < 0.5)
+                for k in rnd.sample(sorted(keys), len(keys)):
+                    self.assertTrue(tree.add(k))
+            slots = assertCompact(self, tree, keys)
+
+            removed = rnd.sample(sorted(keys), len(keys) // 3)
+            for k in removed:
+                self.assertTrue(tree.remove(k))
+            self.assertFalse(tree.remove(-1))
+            keys -= set(removed)
+            assertCompact(self, tree, keys)
+
+            # the freed slots are reused before the buffers grow
+            added = [k for k in rnd.sample(range(200, 400), len(removed))]
+            for k in added:
+                tree.add(k)
+            keys |= set(added)
+            self.assertEqual(max(assertCompact(self, tree, keys) or [-1]),
+                             max(slots or [-1]))
+
+            # removal through the iterator
+            it = tree.iterator()
+            for k in it:
+                if k % 2:
+                    it.remove()
+            assertCompact(self, tree, {k for k in keys if k % 2 == 0})
+
+    def test_zero_alpha(self):
+        tree = CompactBSTSet(True, 0, 5)
+        for k in range(20):
+            tree.add(k)
+        for k in range(0, 20, 3):
+            tree.remove(k)
+        assertCompact(self, tree, {k for k in range(20) if k % 3})
+
+
+##
+#  FrozenBSTSet against sorted lists and bisect, on random sets of keys.
+#
+@unittest.skipIf(fbst is None, "NumPy is not available")
+class TestFrozenBSTSet(unittest.TestCase):
+
+    ## Number of random trials of each test.
+    TRIALS = 300
+
+    def setUp(self):
+        self.rnd = random.Random(2019)
+
+    ## In-order traversal of the slots visits the positions 0, 1, 2, ...
+    def test_positions(self):
+        for n in range(200):
+            pos = fbst.eytzinger_positions(n)
+            order = []
+            stack = []
+            k = 1
+            while stack or k <= n:
+                if k <= n:
+                    stack.append(k)
+                    k = 2 * k
+                else:
+                    k = stack.pop()
+                    order.append(int(pos[k]))
+                    k = 2 * k + 1
+            self.assertEqual(order, list(range(n)))
+
+    def test_queries(self):
+        for i in range(self.TRIALS):
+            keys = sorted(set(self.rnd.sample(range(300), self.rnd.randint(0, 150))))
+            frozen = BalancedBSTSet.from_sorted(keys).freeze()
+            self.assertEqual(len(frozen), len(keys))
+            self.assertEqual(list(frozen), keys)
+            self.assertEqual(frozen.height(), len(keys).bit_length() - 1)
+
+            probes = [self.rnd.randrange(-5, 305) for j in range(50)]
+            self.assertEqual(frozen.contains_many(probes).tolist(), [p in keys for p in probes])
+            for p in probes:
+                self.assertEqual(p in frozen, p in keys)
+                self.assertEqual(frozen.bisect_left(p), bisect_left(keys, p))
+                self.assertEqual(frozen.bisect_right(p), bisect_right(keys, p))
+
+            lo, hi = sorted(self.rnd.sample(range(-5, 305), 2))
+            expected = [k for k in keys if lo < k <= hi]
+            self.assertEqual(frozen.count_range(lo, hi, (False, True)), len(expected))
+            self.assertEqual(frozen.irange(lo, hi, (False, True)).tolist(), expected)
+            self.assertEqual(frozen.irange(lo, hi, (False, True), reverse=True).tolist(),
+                             expected[::-1])
+
+            for ind in range(-len(keys), len(keys)):
+                self.assertEqual(frozen[ind], keys[ind])
+                self.assertIs(type(frozen[ind]), int)
+            self.assertEqual(frozen[1:-1:3], keys[1:-1:3])
+            self.assertEqual(frozen[::-2], keys[::-2])
+
+    def test_non_scalar_keys(self):
+        with self.assertRaises(ValueError):
+            BalancedBSTSet.from_sorted([(1, 2), (3, 4), (5, 6)]).freeze()
+
+
+if __name__ == "__main__":
+    unittest.main()